@@ -5,16 +5,15 @@ from views.edit import edit_exam
 from views.history import show_history
 from views.create import create_exam
 from views.notes import show_notes
+from views.search import show_search
 
 st.set_page_config(page_title="", layout="wide")
 
 def init_session_state():
     if "current_question" not in st.session_state:
         st.session_state.current_question = 0
-    if "exam_data" not in st.session_state:
-        st.session_state.exam_data = None
-    if "start_time" not in st.session_state:
-        st.session_state.start_time = None
+    if "attempt" not in st.session_state:
+        st.session_state.attempt = None
     if "editing_question" not in st.session_state:
         st.session_state.editing_question = 0
     if "needs_rerun" not in st.session_state:
@@ -29,7 +28,7 @@ def main():
     init_session_state()
 
     # Define available modes
-    modes = ["Practice", "Create", "Edit", "History", "Notes"]
+    modes = ["Practice", "Create", "Edit", "History", "Notes", "Search"]
 
     user = authenticate()
     if not user:
@@ -89,6 +88,8 @@ def main():
         show_history()
     elif mode == "Notes":
         show_notes()
+    elif mode == "Search":
+        show_search()
     else:
         practice_exam()
 
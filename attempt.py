@@ -0,0 +1,76 @@
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Mapping, Optional
+from database import get_shared_questions
+
+
+class PracticeAttempt:
+    """Compact per-session state of an in-progress practice attempt.
+
+    Only question numbers, answers and marks are held here; question content
+    is looked up by number in the process-wide read-only question store, so
+    sessions never copy or mutate the shared question documents.
+    """
+    __slots__ = ("exam", "provider", "question_numbers", "answers", "marks",
+                 "session_minutes", "batch_number", "batch_range", "started_at")
+
+    def __init__(self, exam: str, provider: str, question_numbers: Iterable[int],
+                 session_minutes: int, batch_number: int, batch_range: str,
+                 started_at: Optional[datetime] = None):
+        self.exam = exam
+        self.provider = provider
+        self.question_numbers = array("i", question_numbers)
+        self.answers: List[str] = [""] * len(self.question_numbers)
+        self.marks = bytearray(len(self.question_numbers))
+        self.session_minutes = session_minutes
+        self.batch_number = batch_number
+        self.batch_range = batch_range
+        self.started_at = started_at or datetime.now()
+
+    def __len__(self) -> int:
+        return len(self.question_numbers)
+
+    def question(self, index: int) -> Optional[Mapping]:
+        return get_shared_questions(self.exam, self.provider, [self.question_numbers[index]])[0]
+
+    def questions(self) -> List[Optional[Mapping]]:
+        """Questions by position, None where a re-import removed one since the attempt started"""
+        return get_shared_questions(self.exam, self.provider, list(self.question_numbers))
+
+    def available_indexes(self) -> List[int]:
+        return [i for i, question in enumerate(self.questions()) if question is not None]
+
+    def graded_answers(self) -> List[Dict]:
+        """Answers checked against the verified answers; removed questions count as not answered"""
+        graded = []
+        for question_number, question, answer in zip(self.question_numbers, self.questions(), self.answers):
+            user_answer = answer.upper() if question is not None else ""
+            verified_answer = question.get("verifiedAnswer", "").upper() if question is not None else ""
+            graded.append({
+                "questionNumber": question_number,
+                "verifiedAnswer": verified_answer,
+                "userAnswer": user_answer,
+                "correct": question is not None and user_answer == verified_answer
+            })
+        return graded
+
+    def to_checkpoint(self, current_question: int) -> Dict:
+        return {
+            "questionNumbers": list(self.question_numbers),
+            "answers": list(self.answers),
+            "marks": [bool(m) for m in self.marks],
+            "currentQuestion": current_question,
+            "sessionMinutes": self.session_minutes,
+            "batchNumber": self.batch_number,
+            "batchRange": self.batch_range,
+            "startedAt": self.started_at
+        }
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint: Dict) -> "PracticeAttempt":
+        attempt = cls(checkpoint["exam"], checkpoint["provider"], checkpoint["questionNumbers"],
+                      checkpoint["sessionMinutes"], checkpoint["batchNumber"],
+                      checkpoint["batchRange"], checkpoint["startedAt"])
+        attempt.answers = list(checkpoint["answers"])
+        attempt.marks = bytearray(checkpoint["marks"])
+        return attempt
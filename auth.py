@@ -1,5 +1,19 @@
 import streamlit as st
+import secrets
+import threading
+import time
+import msal
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from database import load_token_cache, save_token_cache
+from key_derivation import TOKEN_CACHE_ENCRYPTION, derive_key
 
+ONEDRIVE_SCOPES = ["Files.ReadWrite"]
+# Fetch a new access token this many seconds before the current one expires
+TOKEN_REFRESH_MARGIN = 300
+
+_token_lock = threading.Lock()
+_access_token = {"token": None, "expires_at": 0.0}
 
 def init_auth():
     if 'user_email' not in st.session_state:
@@ -57,3 +71,77 @@ def show_user_info():
             unsafe_allow_html=True
         )
         st.sidebar.divider()
+
+def _token_cache_key() -> bytes:
+    return derive_key(bytes.fromhex(st.secrets["AES_KEY"]), TOKEN_CACHE_ENCRYPTION)
+
+def _persist_token_cache(cache: msal.SerializableTokenCache):
+    """Store the MSAL cache encrypted in Mongo so it survives restarts"""
+    if cache.has_state_changed:
+        nonce = secrets.token_bytes(12)
+        state = AESGCM(_token_cache_key()).encrypt(nonce, cache.serialize().encode(), None)
+        save_token_cache(nonce + state)
+        cache.has_state_changed = False
+
+@st.cache_resource
+def get_msal_app() -> msal.PublicClientApplication:
+    """Process-wide MSAL client backed by the persisted token cache"""
+    client_id = st.secrets.get("MICROSOFT_CLIENT_ID")
+    tenant_id = st.secrets.get("MICROSOFT_TENANT_ID", "common")
+    if not client_id:
+        raise ValueError("MICROSOFT_CLIENT_ID not configured in secrets")
+    
+    cache = msal.SerializableTokenCache()
+    stored = load_token_cache()
+    if stored:
+        try:
+            state = AESGCM(_token_cache_key()).decrypt(stored[:12], stored[12:], None)
+            cache.deserialize(state.decode())
+        except InvalidTag:
+            # Written under a previous key; start empty and sign in again
+            print("Stored token cache could not be decrypted, ignoring it")
+    return msal.PublicClientApplication(
+        client_id,
+        authority=f"https://login.microsoftonline.com/{tenant_id}",
+        token_cache=cache
+    )
+
+def _remember_token(result: dict) -> str:
+    _access_token["token"] = result["access_token"]
+    _access_token["expires_at"] = time.time() + int(result.get("expires_in", 0))
+    _persist_token_cache(get_msal_app().token_cache)
+    return result["access_token"]
+
+def get_msal_access_token() -> str:
+    """Get OneDrive access token using MSAL with cached credentials"""
+    with _token_lock:
+        if _access_token["token"] and time.time() < _access_token["expires_at"] - TOKEN_REFRESH_MARGIN:
+            return _access_token["token"]
+        
+        app = get_msal_app()
+        accounts = app.get_accounts()
+        if accounts:
+            # Uses the refresh token when the cached access token is close to expiry
+            result = app.acquire_token_silent(ONEDRIVE_SCOPES, account=accounts[0])
+            if result and "access_token" in result:
+                return _remember_token(result)
+    
+    # If no cached token, user needs to authenticate
+    raise Exception(
+        "No cached OneDrive authentication available. Use \"Sign in to OneDrive\" first."
+    )
+
+def start_onedrive_login() -> dict:
+    """Begin a device code login; show the returned flow's "message" to the user"""
+    flow = get_msal_app().initiate_device_flow(scopes=ONEDRIVE_SCOPES)
+    if "user_code" not in flow:
+        raise Exception(f"Could not start OneDrive login: {flow.get('error_description', flow)}")
+    return flow
+
+def complete_onedrive_login(flow: dict) -> str:
+    """Wait for the user to finish the device code login and cache the resulting tokens"""
+    result = get_msal_app().acquire_token_by_device_flow(flow)
+    if "access_token" not in result:
+        raise Exception(f"OneDrive login failed: {result.get('error_description', result)}")
+    with _token_lock:
+        return _remember_token(result)
@@ -0,0 +1,66 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+import streamlit as st
+from database import save_attempt_checkpoint, delete_attempt_checkpoint
+
+# Upper bound on how long an answer change can wait before it is written
+FLUSH_INTERVAL_SECONDS = 15
+
+CheckpointKey = Tuple[str, str, str]
+
+
+class CheckpointBuffer:
+    """Write-behind buffer for in-progress attempt checkpoints.
+
+    Answer changes only replace the pending checkpoint for their
+    (email, exam, provider) key, so any number of reruns between flushes
+    cost a single write. A background thread flushes at a fixed interval.
+    """
+
+    def __init__(self, interval: float = FLUSH_INTERVAL_SECONDS):
+        self._pending: Dict[CheckpointKey, Dict] = {}
+        self._lock = threading.Lock()
+        # Serializes writes so a discarded checkpoint is never written back after its delete
+        self._write_lock = threading.Lock()
+        self._interval = interval
+        self._thread = threading.Thread(target=self._run, name="attempt-autosave", daemon=True)
+        self._thread.start()
+
+    def update(self, key: CheckpointKey, checkpoint: Dict):
+        with self._lock:
+            self._pending[key] = checkpoint
+
+    def flush(self, key: Optional[CheckpointKey] = None):
+        """Write the pending checkpoint for key, or every pending checkpoint"""
+        with self._write_lock:
+            with self._lock:
+                if key is None:
+                    batch, self._pending = self._pending, {}
+                else:
+                    batch = {key: self._pending.pop(key)} if key in self._pending else {}
+            for (email, exam_name, provider), checkpoint in batch.items():
+                try:
+                    save_attempt_checkpoint(email, exam_name, provider, checkpoint)
+                except Exception as e:
+                    print(f"Error saving attempt checkpoint: {str(e)}")
+                    # Retry on the next flush unless a newer checkpoint arrived meanwhile
+                    with self._lock:
+                        self._pending.setdefault((email, exam_name, provider), checkpoint)
+
+    def discard(self, key: CheckpointKey):
+        """Drop the pending and stored checkpoint once the attempt is finished"""
+        with self._write_lock:
+            with self._lock:
+                self._pending.pop(key, None)
+            delete_attempt_checkpoint(*key)
+
+    def _run(self):
+        while True:
+            time.sleep(self._interval)
+            self.flush()
+
+
+@st.cache_resource
+def get_checkpoint_buffer() -> CheckpointBuffer:
+    return CheckpointBuffer()
@@ -0,0 +1,374 @@
+"""Time database.py functions and the main views on synthetic exams.
+
+Run from the project root:
+
+    python -m benchmarks.run --sizes 100,1000,10000 --attempts 10000 --output bench.json
+
+Without --mongo-uri the data lives in mongomock (pip install mongomock).
+mongomock does not implement every operator the app uses ($range, $text,
+explain), so those benchmarks are reported with an error. That includes
+functions that catch their own errors, whose empty or failed results are
+checked. Point --mongo-uri at a local, disposable mongod for complete
+numbers. The benchmark database
+named by --database is dropped before the run. The question_stats and
+review_schedule backfills replay every attempt and are only timed with
+--migrations.
+
+Results are written as JSON: one record per benchmark with its group,
+name, exam size and timings in milliseconds, for comparing runs.
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional
+from streamlit.testing.v1 import AppTest
+import database
+import migrations
+from exam_import import import_exam
+from benchmarks.synthetic import (BENCH_PROVIDER, derive_question_state, generate_attempts,
+                                  generate_exam, generate_notes, insert_exam)
+
+BENCH_USER = "bench@example.com"
+DEFAULT_SIZES = "100,1000,10000"
+DEFAULT_ATTEMPTS = 10000
+QUESTIONS_PER_SESSION = 10
+VIEW_TIMEOUT_SECONDS = 600
+
+# Every keyed cache, cleared before each run so reads are measured cold
+KEYED_CACHES = [
+    database.get_exam, database.get_exam_light, database.get_exam_metadata,
+    database.get_question_store, database.get_question_details,
+    database.get_exam_notes, database.get_all_user_notes, database.get_user_exam_attempts,
+    database.get_all_user_attempts, database.get_weak_questions, database.get_review_session,
+    database.get_attempt_checkpoint,
+]
+
+
+def clear_caches():
+    for cached in KEYED_CACHES:
+        cached.clear()
+    database.get_exam_list.clear()
+
+
+def connect(mongo_uri: Optional[str], database_name: str):
+    if mongo_uri:
+        import pymongo
+        client = pymongo.MongoClient(mongo_uri)
+        backend = f"mongodb {client.server_info()['version']}"
+    else:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("mongomock is not installed; pip install mongomock or pass --mongo-uri")
+        client = mongomock.MongoClient()
+        backend = f"mongomock {mongomock.__version__}"
+    client.drop_database(database_name)
+    db = client[database_name]
+    # Route every database.py call, including those made by the views, to the benchmark database
+    database.get_database = lambda: db
+    migrations.bootstrap_database(db)
+    return db, backend
+
+
+class BenchmarkFailure(Exception):
+    """A function reported failure through its return value instead of raising"""
+
+
+def expect(run: Callable[[], object], valid: Callable[[object], bool]) -> Callable[[], object]:
+    """run() for functions that catch their own errors, failing when the result is invalid"""
+    def checked():
+        result = run()
+        if not valid(result):
+            raise BenchmarkFailure(f"returned {result!r}")
+        return result
+    return checked
+
+
+def measure(run: Callable[[], object], repeat: int, setup: Callable[[], None] = clear_caches) -> Dict:
+    """Timings of run() in milliseconds, or the error it raised"""
+    timings = []
+    for _ in range(repeat):
+        setup()
+        # database.py prints the errors it swallows; keep them for the failure message
+        printed = io.StringIO()
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(printed):
+                run()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if printed.getvalue().strip():
+                error += f" ({printed.getvalue().strip().splitlines()[-1]})"
+            return {"error": error}
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "runs": len(timings),
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+    }
+
+
+def populate(db, rng: random.Random, sizes: List[int], attempt_count: int) -> Dict[int, Dict]:
+    """One exam per size plus notes and attempts for the benchmark user"""
+    exams = {}
+    for size in sizes:
+        exam_name = f"Bench {size}"
+        questions = generate_exam(rng, exam_name, size)
+        insert_exam(db, questions, QUESTIONS_PER_SESSION)
+        notes = generate_notes(rng, BENCH_USER, exam_name, size)
+        if notes:
+            db.notes.insert_many(notes)
+        exams[size] = {"name": exam_name, "questions": questions}
+    if attempt_count:
+        attempts = generate_attempts(
+            rng, BENCH_USER, {exam["name"]: size for size, exam in exams.items()},
+            attempt_count, QUESTIONS_PER_SESSION
+        )
+        db.progress.insert_many(attempts)
+        for collection, documents in derive_question_state(attempts).items():
+            db[collection].insert_many(documents)
+    return exams
+
+
+def database_benchmarks(exam_name: str, questions: List[Dict],
+                        saved_seconds: Iterator[int]) -> Dict[str, Callable[[], object]]:
+    """Calls of every database.py data access function against one exam.
+
+    saved_seconds is shared by every exam, so saved attempts get distinct timestamps
+    older than the synthetic history.
+    """
+    size = len(questions)
+    middle = max(size // 2, 1)
+    batch = list(range(middle, min(middle + QUESTIONS_PER_SESSION, size + 1)))
+    key = (exam_name, BENCH_PROVIDER)
+    exam_file = json.dumps(questions).encode("utf-8")
+    answers = [
+        {"questionNumber": n, "verifiedAnswer": "A", "userAnswer": "A", "correct": n % 2 == 0}
+        for n in batch
+    ]
+    attempt = database.get_database().progress.find_one(
+        {"email": BENCH_USER, "exam": exam_name}, {"_id": 1}
+    )
+
+    return {
+        "get_exam_list": database.get_exam_list,
+        "get_exam": lambda: database.get_exam(*key),
+        "get_exam_light": lambda: database.get_exam_light(*key),
+        "get_exam_metadata": lambda: database.get_exam_metadata(*key),
+        "get_batch_question_numbers": lambda: database.get_batch_question_numbers(
+            *key, middle, QUESTIONS_PER_SESSION),
+        "get_shared_questions": lambda: database.get_shared_questions(*key, batch),
+        "get_question_details": lambda: database.get_question_details(*key, middle),
+        "question_state_metadata": lambda: database.question_state_metadata(
+            database.get_database(), *key),
+        "update_single_question": expect(
+            lambda: database.update_single_question(*key, middle, "A", False), lambda ok: ok),
+        "bulk_update_questions": expect(lambda: database.bulk_update_questions(
+            *key, {n: {"verifiedAnswer": "A"} for n in range(1, size + 1, 10)}), lambda r: r is not None),
+        "update_exam_metadata": lambda: database.update_exam_metadata(
+            *key, 60, size, QUESTIONS_PER_SESSION),
+        "update_exam_questions": lambda: database.update_exam_questions(*key, questions),
+        "save_exam": lambda: database.save_exam(questions, 60, size, QUESTIONS_PER_SESSION),
+        "import_exam_incremental": lambda: import_exam(
+            io.BytesIO(exam_file), 60, size, QUESTIONS_PER_SESSION, incremental=True),
+        "save_note": expect(
+            lambda: database.save_note(BENCH_USER, *key, middle, "benchmark note"), lambda ok: ok),
+        # save_note leaves a note and all texts share one vocabulary, so empty results mean failure
+        "get_exam_notes": expect(lambda: database.get_exam_notes(BENCH_USER, *key), bool),
+        "search_questions": expect(lambda: database.search_questions("gateway latency"), bool),
+        "search_notes": expect(lambda: database.search_notes(BENCH_USER, "gateway latency"), bool),
+        "save_user_progress": lambda: database.save_user_progress(BENCH_USER, *key, {
+            "score": 50.0, "duration_minutes": 10.0,
+            "completed_at": datetime.now().replace(microsecond=0) - timedelta(days=400, seconds=next(saved_seconds)),
+            "answers": answers, "batch_number": 1, "batch_range": "benchmark"
+        }),
+        "get_user_exam_attempts": lambda: database.get_user_exam_attempts(BENCH_USER, *key, 10),
+        "get_attempt_answers": lambda: database.get_attempt_answers(attempt["_id"] if attempt else None),
+        "get_weak_questions": lambda: database.get_weak_questions(BENCH_USER, *key),
+        "get_review_session": lambda: database.get_review_session(
+            BENCH_USER, *key, QUESTIONS_PER_SESSION),
+        "save_attempt_checkpoint": lambda: database.save_attempt_checkpoint(
+            BENCH_USER, *key, {"questionNumbers": batch, "answers": [""] * len(batch)}),
+        "get_attempt_checkpoint": lambda: database.get_attempt_checkpoint(BENCH_USER, *key),
+        "delete_attempt_checkpoint": lambda: database.delete_attempt_checkpoint(BENCH_USER, *key),
+    }
+
+
+def global_benchmarks(db, with_migrations: bool) -> Dict[str, Callable[[], object]]:
+    """Functions that are not scoped to one exam"""
+    manifest = {f"image{i}.png": {"contentHash": f"{i:064x}", "itemId": str(i)} for i in range(500)}
+    benchmarks = {
+        "get_all_user_attempts": lambda: database.get_all_user_attempts(BENCH_USER),
+        "get_all_user_notes": expect(lambda: database.get_all_user_notes(BENCH_USER), bool),
+        "save_image_manifest": lambda: database.save_image_manifest("bench", "folder", manifest),
+        "get_image_manifest": lambda: database.get_image_manifest("bench"),
+        "save_token_cache": lambda: database.save_token_cache(b"x" * 4096),
+        "load_token_cache": database.load_token_cache,
+        "verify_query_plans": lambda: migrations.verify_query_plans(db),
+    }
+    if with_migrations:
+        # Replays every attempt; slow on mongomock, whose upserts scan the collection
+        benchmarks["backfill_question_stats"] = lambda: migrations.backfill_question_stats(db)
+        benchmarks["backfill_review_schedule"] = lambda: migrations.backfill_review_schedule(db)
+    return benchmarks
+
+
+def view_script(module: str, function: str) -> str:
+    return "\n".join([
+        "import streamlit as st",
+        "from app import init_session_state",
+        f"st.session_state.user_email = {BENCH_USER!r}",
+        "init_session_state()",
+        f"from views.{module} import {function}",
+        f"{function}()",
+    ])
+
+
+def click(label: str) -> Callable[[AppTest], object]:
+    return lambda at: next(b for b in at.button if b.label == label).click().run()
+
+
+def view_steps(exam_key: tuple) -> Dict[str, Dict[str, Callable[[AppTest], object]]]:
+    """Interactions timed for each view, applied in order to one AppTest session"""
+    select_exam = lambda at: at.selectbox[0].select(exam_key).run()
+    return {
+        "practice_exam": {
+            "open": lambda at: at.run(),
+            "select_exam": select_exam,
+            "start_attempt": click("Start New Attempt"),
+            "next_question": click("Next"),
+        },
+        "edit_exam": {
+            "open": lambda at: at.run(),
+            "select_exam": select_exam,
+            "next_question": click("Next →"),
+            "filter_unverified": lambda at: at.sidebar.selectbox(key="nav_filter").select("Unverified").run(),
+        },
+        "show_history": {
+            "open": lambda at: at.run(),
+            "select_exam": select_exam,
+        },
+        "show_notes": {
+            "open": lambda at: at.run(),
+            "select_exam": select_exam,
+        },
+    }
+
+
+VIEW_MODULES = {
+    "practice_exam": "practice",
+    "edit_exam": "edit",
+    "show_history": "history",
+    "show_notes": "notes",
+}
+
+
+def time_view(function: str, steps: Dict[str, Callable[[AppTest], object]], repeat: int) -> Dict[str, Dict]:
+    """Timings of each step of a view, from a fresh session with cold caches every repeat"""
+    timings = {step: [] for step in steps}
+    errors = {}
+    for _ in range(repeat):
+        clear_caches()
+        at = AppTest.from_string(view_script(VIEW_MODULES[function], function),
+                                 default_timeout=VIEW_TIMEOUT_SECONDS)
+        for step, interact in steps.items():
+            start = time.perf_counter()
+            try:
+                interact(at)
+            except Exception as e:
+                errors[step] = f"{type(e).__name__}: {e}"
+            if not errors and at.exception:
+                errors[step] = at.exception[0].message
+            if errors:
+                break
+            timings[step].append((time.perf_counter() - start) * 1000)
+        if errors:
+            break
+
+    results = {}
+    for step, values in timings.items():
+        if step in errors:
+            results[step] = {"error": errors[step]}
+        elif values:
+            results[step] = {
+                "runs": len(values),
+                "min_ms": round(min(values), 3),
+                "median_ms": round(statistics.median(values), 3),
+                "mean_ms": round(statistics.mean(values), 3),
+            }
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"comma-separated exam sizes in questions (default {DEFAULT_SIZES})")
+    parser.add_argument("--attempts", type=int, default=DEFAULT_ATTEMPTS,
+                        help=f"completed attempts to generate (default {DEFAULT_ATTEMPTS})")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark (default 5)")
+    parser.add_argument("--mongo-uri", help="MongoDB server to use instead of mongomock")
+    parser.add_argument("--database", default="quizdb_bench",
+                        help="benchmark database name, dropped first (default quizdb_bench)")
+    parser.add_argument("--skip-views", action="store_true", help="only time database functions")
+    parser.add_argument("--migrations", action="store_true",
+                        help="also time the backfill migrations that replay every attempt")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    db, backend = connect(args.mongo_uri, args.database)
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    exams = populate(db, rng, sizes, args.attempts)
+    print(f"Generated {len(sizes)} exams and {args.attempts} attempts in "
+          f"{time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    results = []
+
+    def record(group: str, name: str, exam_size: Optional[int], timing: Dict):
+        results.append({"group": group, "name": name, "examSize": exam_size, **timing})
+        summary = timing.get("error") or f"{timing['median_ms']:.2f} ms"
+        print(f"{group:9} {name:32} {exam_size or '':>6} {summary}", file=sys.stderr)
+
+    for name, run in global_benchmarks(db, args.migrations).items():
+        record("database", name, None, measure(run, args.repeat))
+    saved_seconds = itertools.count()
+    for size in sizes:
+        exam = exams[size]
+        for name, run in database_benchmarks(exam["name"], exam["questions"], saved_seconds).items():
+            record("database", name, size, measure(run, args.repeat))
+    if not args.skip_views:
+        for size in sizes:
+            exam_key = (exams[size]["name"], BENCH_PROVIDER)
+            for function, steps in view_steps(exam_key).items():
+                for step, timing in time_view(function, steps, args.repeat).items():
+                    record("view", f"{function}/{step}", size, timing)
+
+    report = {
+        "createdAt": datetime.now().isoformat(timespec="seconds"),
+        "backend": backend,
+        "python": platform.python_version(),
+        "config": {"sizes": sizes, "attempts": args.attempts, "repeat": args.repeat, "seed": args.seed,
+                   "migrations": args.migrations, "views": not args.skip_views},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
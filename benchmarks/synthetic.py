@@ -0,0 +1,145 @@
+"""Synthetic exams, notes and attempts shaped like real question bank data."""
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+import database
+from question_features import content_hash, extract_features
+from spaced_repetition import next_review
+
+WORDS = ("cluster node storage network policy identity region replica backup latency "
+         "throughput gateway function container queue topic partition subnet role key "
+         "vault certificate endpoint pipeline deployment scale monitor alert log metric").split()
+OPTION_LETTERS = "ABCDEF"
+BENCH_PROVIDER = "Bench"
+
+
+def sentence(rng: random.Random, min_words: int, max_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))).capitalize() + "."
+
+
+def generate_question(rng: random.Random, exam_name: str, question_number: int,
+                      mean_comments: int) -> Dict:
+    """One question with HTML text, 4-6 options and a long tail of comments"""
+    multi_select = rng.random() < 0.2
+    options = [
+        {"optionLetter": letter, "optionText": sentence(rng, 4, 16)}
+        for letter in OPTION_LETTERS[:rng.randint(4, 6)]
+    ]
+    answer_count = 2 if multi_select else 1
+    answer = "".join(sorted(rng.sample([o["optionLetter"] for o in options], answer_count)))
+    text = "<p>" + " ".join(sentence(rng, 8, 20) for _ in range(rng.randint(2, 5))) + "</p>"
+    if multi_select:
+        text += "<p>Choose two.</p>"
+    comment_count = min(int(rng.expovariate(1 / mean_comments)), mean_comments * 8) if mean_comments else 0
+    return {
+        "exam": exam_name,
+        "provider": BENCH_PROVIDER,
+        "questionNumber": question_number,
+        "questionText": text,
+        "options": options,
+        "comments": [
+            {"commentHead": f"user{rng.randint(1, 5000)} {rng.randint(1, 36)} months ago",
+             "commentContent": " ".join(sentence(rng, 6, 30) for _ in range(rng.randint(1, 4)))}
+            for _ in range(comment_count)
+        ],
+        "voteDistribution": [{"voted_answers": answer, "vote_count": rng.randint(1, 200)}],
+        "suggestedAnswer": answer,
+        "verifiedAnswer": answer if rng.random() < 0.5 else "",
+        "isMarked": rng.random() < 0.05
+    }
+
+
+def generate_exam(rng: random.Random, exam_name: str, question_count: int,
+                  mean_comments: int = 8) -> List[Dict]:
+    return [generate_question(rng, exam_name, n, mean_comments) for n in range(1, question_count + 1)]
+
+
+def insert_exam(db, questions: List[Dict], questions_per_session: int = 10):
+    """Write an exam straight into the collections, bypassing the import path being measured"""
+    exam_name = questions[0]["exam"]
+    db.questions.insert_many([
+        {**q, **extract_features(q), "contentHash": content_hash(q)} for q in questions
+    ])
+    db.exams.insert_one({
+        "exam": exam_name,
+        "provider": BENCH_PROVIDER,
+        "metadata": {
+            "sessionTime": 60,
+            "totalQuestions": len(questions),
+            "uploadedQuestions": len(questions),
+            "questionsPerSession": questions_per_session,
+            "missingQuestions": [],
+            "hasMissingQuestions": False,
+            "version": 1,
+            **database.question_state(questions)
+        }
+    })
+
+
+def generate_attempts(rng: random.Random, email: str, exams: Dict[str, int], attempt_count: int,
+                      questions_per_session: int = 10) -> List[Dict]:
+    """Completed attempts spread over the last year, batches chosen at random"""
+    now = datetime.now()
+    attempts = []
+    names = list(exams)
+    # Distinct completion seconds, as attempts by one user never finish in the same second
+    offsets = rng.sample(range(1, 365 * 24 * 3600), attempt_count)
+    for offset in offsets:
+        exam_name = rng.choice(names)
+        batches = max(exams[exam_name] // questions_per_session, 1)
+        batch = rng.randrange(batches)
+        first = batch * questions_per_session + 1
+        answers = []
+        for question_number in range(first, min(first + questions_per_session, exams[exam_name] + 1)):
+            correct = rng.random() < 0.7
+            answers.append({
+                "questionNumber": question_number,
+                "verifiedAnswer": "A",
+                "userAnswer": "A" if correct else "B",
+                "correct": correct
+            })
+        score = 100 * sum(a["correct"] for a in answers) / len(answers)
+        attempts.append({
+            "email": email,
+            "exam": exam_name,
+            "provider": BENCH_PROVIDER,
+            "score": score,
+            "completed_at": (now - timedelta(seconds=offset)).replace(microsecond=0),
+            "duration_minutes": rng.uniform(5, 60),
+            "answers": answers,
+            "batch_number": batch + 1,
+            "batch_range": f"Questions {first} - {first + len(answers) - 1}"
+        })
+    return attempts
+
+
+def generate_notes(rng: random.Random, email: str, exam_name: str, question_count: int,
+                   note_ratio: float = 0.1) -> List[Dict]:
+    return [
+        {"email": email, "exam": exam_name, "provider": BENCH_PROVIDER, "questionNumber": n,
+         "text": sentence(rng, 5, 40), "updated_at": datetime.now()}
+        for n in range(1, question_count + 1) if rng.random() < note_ratio
+    ]
+
+
+def derive_question_state(attempts: List[Dict]) -> Dict[str, List[Dict]]:
+    """question_stats and review_schedule documents equal to replaying the attempts,
+    computed in memory so large data sets load without thousands of upserts"""
+    stats = {}
+    schedules = {}
+    for attempt in sorted(attempts, key=lambda a: a["completed_at"]):
+        for answer in attempt["answers"]:
+            key = (attempt["email"], attempt["exam"], attempt["provider"], answer["questionNumber"])
+            stat = stats.setdefault(key, {"attempts": 0, "correct": 0, "incorrect": 0})
+            stat["attempts"] += 1
+            stat["correct" if answer["correct"] else "incorrect"] += 1
+            stat["lastSeen"] = attempt["completed_at"]
+            stat["lastResult"] = answer["correct"]
+            schedules[key] = next_review(schedules.get(key), answer["correct"], attempt["completed_at"])
+
+    def documents(states: Dict) -> List[Dict]:
+        return [
+            {"email": email, "exam": exam_name, "provider": provider, "questionNumber": number, **state}
+            for (email, exam_name, provider, number), state in states.items()
+        ]
+    return {"question_stats": documents(stats), "review_schedule": documents(schedules)}
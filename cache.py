@@ -0,0 +1,95 @@
+import copy
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+
+def keyed_cache(ttl: int = 600, copy_values: bool = True, max_entries: int = 1000):
+    """Process-wide memoization keyed by positional arguments.
+
+    Behaves like st.cache_data: values are stored pickled and every hit
+    unpickles a fresh copy, which is about twice as fast as deep-copying.
+    Unlike st.cache_data, entries can be dropped one key at a time with `invalidate(*args)`,
+    by key prefix with `invalidate_prefix(*args)`, or updated after a write
+    with `patch(*args, update=fn)`. With copy_values=False every caller
+    shares the cached object, which must then be treated as read-only.
+    Expired entries are evicted when new ones are stored, and the oldest
+    entries once there are more than max_entries.
+    """
+    if copy_values:
+        encode = lambda value: pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        decode = pickle.loads
+    else:
+        encode = decode = lambda value: value
+    # Shared values are read-only below the top level, so patching those only copies the container
+    copy_for_patch = decode if copy_values else copy.copy
+
+    def decorator(func):
+        entries = OrderedDict()
+        lock = threading.Lock()
+        # Bumped on every invalidation so loads that started earlier are not stored
+        generation = [0]
+
+        def store(args, value, now):
+            """Insert under the lock, evicting from the front: insertion order is expiry order"""
+            entries[args] = (now + ttl, value)
+            entries.move_to_end(args)
+            while len(entries) > max_entries or next(iter(entries.values()))[0] <= now:
+                entries.popitem(last=False)
+
+        @wraps(func)
+        def wrapper(*args):
+            now = time.monotonic()
+            with lock:
+                entry = entries.get(args)
+                started_generation = generation[0]
+            if entry is not None and entry[0] > now:
+                return decode(entry[1])
+
+            value = func(*args)
+            stored = encode(value)
+            with lock:
+                if generation[0] == started_generation:
+                    store(args, stored, now)
+            # With copy_values the stored bytes are independent of the value returned here
+            return value
+
+        def invalidate(*args):
+            with lock:
+                entries.pop(args, None)
+                generation[0] += 1
+
+        def invalidate_prefix(*prefix):
+            with lock:
+                for key in [k for k in entries if k[:len(prefix)] == prefix]:
+                    del entries[key]
+                generation[0] += 1
+
+        def clear():
+            with lock:
+                entries.clear()
+                generation[0] += 1
+
+        def patch(*args, update):
+            """Apply update(value) to the cached value for args, if it is cached.
+
+            The update is applied to a copy that then replaces the entry, so
+            callers still copying or reading the previous value never see it change.
+            """
+            with lock:
+                entry = entries.get(args)
+                value = copy_for_patch(entry[1]) if entry is not None else None
+                if value is not None:
+                    update(value)
+                    entries[args] = (entry[0], encode(value))
+                generation[0] += 1
+
+        wrapper.invalidate = invalidate
+        wrapper.invalidate_prefix = invalidate_prefix
+        wrapper.clear = clear
+        wrapper.patch = patch
+        return wrapper
+
+    return decorator
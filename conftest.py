@@ -0,0 +1 @@
+# Puts the project root on sys.path so tests import the top-level modules
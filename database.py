@@ -1,138 +1,389 @@
 import pymongo
+from pymongo import ReplaceOne, UpdateOne, ReturnDocument
 import streamlit as st
-from typing import List, Dict
+from typing import List, Dict, Mapping, Optional
 from datetime import datetime
+from types import MappingProxyType
+from cache import keyed_cache
+from question_features import USER_STATE_FIELDS, content_hash, extract_features
+from spaced_repetition import next_review
+
+# Number of question documents sent per bulk_write call
+QUESTION_BATCH_SIZE = 500
+# Most results returned by one search query
+SEARCH_RESULT_LIMIT = 50
+# Question numbers checked per round trip when looking for unscheduled questions
+REVIEW_SCAN_BATCH_SIZE = 200
+# Most slices scanned per review session, so a nearly fully scheduled exam stays cheap
+REVIEW_SCAN_MAX_BATCHES = 10
+# Heavy per-question fields that are only shown in the "Show Details" panel
+QUESTION_DETAIL_FIELDS = ["comments", "voteDistribution", "suggestedAnswer"]
+# Question fields needed to render and score a question; plainText only exists for search
+LIGHT_QUESTION_PROJECTION = {
+    "_id": 0, "plainText": 0, **{field: 0 for field in QUESTION_DETAIL_FIELDS}
+}
 
 @st.cache_resource
 def get_database():
     # Initialize connection using connection string from host
     client = pymongo.MongoClient(st.secrets["mongo"]["connection_string"])
-    return client.quizdb
+    db = client.quizdb
+    # Create indexes and apply pending migrations once per process
+    from migrations import bootstrap_database
+    bootstrap_database(db)
+    return db
 
-def find_missing_questions(questions: List[Dict], total_questions: int) -> List[int]:
-    # Sort questions by number
-    question_numbers = sorted([q['questionNumber'] for q in questions])
-    expected_range = set(range(1, total_questions + 1))
-    actual_numbers = set(question_numbers)
-    return sorted(list(expected_range - actual_numbers))
+def question_key(exam_name: str, provider: str, question_number: int) -> Dict:
+    return {"exam": exam_name, "provider": provider, "questionNumber": question_number}
 
-def save_exam(exam_data: List[Dict], session_time: int, total_questions: int, 
-             uploaded_questions: int, questions_per_session: int):
-    db = get_database()
+def write_questions(db, exam_name: str, provider: str, questions: List[Dict]):
+    """Upsert one document per question, with its derived features, into the questions collection"""
+    for i in range(0, len(questions), QUESTION_BATCH_SIZE):
+        operations = [
+            ReplaceOne(
+                question_key(exam_name, provider, q["questionNumber"]),
+                {**q, **extract_features(q), "contentHash": content_hash(q),
+                 "exam": exam_name, "provider": provider},
+                upsert=True
+            )
+            for q in questions[i:i + QUESTION_BATCH_SIZE]
+        ]
+        db.questions.bulk_write(operations, ordered=False)
+
+class ConcurrentModificationError(Exception):
+    """The exam was changed by another writer since the caller read it"""
+
+def question_state(questions: List[Dict]) -> Dict:
+    """Verification counters and canonical question order of a list of questions"""
+    questions = sorted(questions, key=lambda q: q["questionNumber"])
+    return {
+        "questionOrder": [q["questionNumber"] for q in questions],
+        "verifiedCount": sum(1 for q in questions if q.get("verifiedAnswer")),
+        "markedQuestions": [q["questionNumber"] for q in questions if q.get("isMarked", False)]
+    }
+
+def question_state_metadata(db, exam_name: str, provider: str) -> Dict:
+    """Verification counters and canonical question order, recomputed from the questions"""
+    return question_state(list(db.questions.find(
+        {"exam": exam_name, "provider": provider},
+        {"_id": 0, "questionNumber": 1, "verifiedAnswer": 1, "isMarked": 1}
+    )))
+
+def exam_filter(exam_name: str, provider: str, expected_version: Optional[int] = None) -> Dict:
+    query = {"exam": exam_name, "provider": provider}
+    if expected_version is not None:
+        query["metadata.version"] = expected_version
+    return query
+
+def metadata_update_pipeline(fields: Dict) -> List[Dict]:
+    """Update pipeline that sets metadata fields, bumps metadata.version and
+    recomputes the derived counts from metadata.questionOrder on the server"""
+    return [
+        {"$set": {
+            **{f"metadata.{field}": {"$literal": value} for field, value in fields.items()},
+            "metadata.version": {"$add": [{"$ifNull": ["$metadata.version", 0]}, 1]}
+        }},
+        {"$set": {
+            "metadata.uploadedQuestions": {"$size": "$metadata.questionOrder"},
+            # Numbers 1..totalQuestions that are not in questionOrder, in ascending order;
+            # $setDifference hashes, where $in inside $filter would scan questionOrder per number
+            "metadata.missingQuestions": {"$sortArray": {
+                "input": {"$setDifference": [
+                    {"$range": [1, {"$add": ["$metadata.totalQuestions", 1]}]},
+                    "$metadata.questionOrder"
+                ]},
+                "sortBy": 1
+            }}
+        }},
+        {"$set": {"metadata.hasMissingQuestions": {"$gt": [{"$size": "$metadata.missingQuestions"}, 0]}}}
+    ]
+
+def check_version_conflict(db, exam_name: str, provider: str):
+    """Called when a versioned update matched nothing: raise if the exam exists"""
+    if db.exams.count_documents({"exam": exam_name, "provider": provider}, limit=1):
+        get_exam.invalidate(exam_name, provider)
+        get_exam_light.invalidate(exam_name, provider)
+        get_exam_metadata.invalidate(exam_name, provider)
+        raise ConcurrentModificationError(f"{exam_name} - {provider} was modified by another user")
+
+def save_exam(exam_data: List[Dict], session_time: int, total_questions: int,
+             questions_per_session: int):
     exam_info = exam_data[0]
     exam_name = exam_info["exam"]
     provider = exam_info["provider"]
     
-    # Find missing questions using total_questions
-    missing_questions = find_missing_questions(exam_data, total_questions)
+    save_exam_questions(exam_name, provider, exam_data)
+    save_exam_metadata(exam_name, provider, [q["questionNumber"] for q in exam_data],
+                       session_time, total_questions, questions_per_session)
+
+def save_exam_questions(exam_name: str, provider: str, questions: List[Dict]):
+    """Write one batch of an exam's questions; call save_exam_metadata once all are written"""
+    write_questions(get_database(), exam_name, provider, questions)
+
+def merge_exam_questions(exam_name: str, provider: str, questions: List[Dict]) -> Dict[str, int]:
+    """Write only the new or changed questions of one batch, keeping their verifiedAnswer and
+    isMarked; returns how many were added, changed and unchanged"""
+    db = get_database()
+    hashes = {q["questionNumber"]: content_hash(q) for q in questions}
+    stored = {
+        doc["questionNumber"]: doc
+        for doc in db.questions.find(
+            {"exam": exam_name, "provider": provider, "questionNumber": {"$in": list(hashes)}},
+            {"_id": 0, "questionNumber": 1, "contentHash": 1, **{field: 1 for field in USER_STATE_FIELDS}}
+        )
+    }
+    
+    summary = {"added": 0, "changed": 0, "unchanged": 0}
+    operations = []
+    for q in questions:
+        question_number = q["questionNumber"]
+        if question_number not in stored:
+            summary["added"] += 1
+            # User state comes from the dump only for questions seen for the first time
+            user_state = {"verifiedAnswer": q.get("verifiedAnswer", ""), "isMarked": q.get("isMarked", False)}
+        elif stored[question_number].get("contentHash") != hashes[question_number]:
+            summary["changed"] += 1
+            user_state = {field: stored[question_number][field]
+                          for field in USER_STATE_FIELDS if field in stored[question_number]}
+        else:
+            summary["unchanged"] += 1
+            continue
+        content = {field: value for field, value in q.items() if field not in USER_STATE_FIELDS}
+        # Replace rather than $set, so fields the refreshed dump no longer has are dropped
+        operations.append(ReplaceOne(
+            question_key(exam_name, provider, question_number),
+            {**content, **user_state, **extract_features(q), "contentHash": hashes[question_number],
+             "exam": exam_name, "provider": provider},
+            upsert=True
+        ))
+    if operations:
+        db.questions.bulk_write(operations, ordered=False)
+    return summary
+
+def save_exam_metadata(exam_name: str, provider: str, question_numbers: List[int],
+                       session_time: int, total_questions: int, questions_per_session: int) -> int:
+    """Save exam settings and question state; returns how many old questions were dropped"""
+    db = get_database()
+    
+    # Drop questions that are no longer part of the uploaded exam
+    removed = db.questions.delete_many({
+        "exam": exam_name,
+        "provider": provider,
+        "questionNumber": {"$nin": list(question_numbers)}
+    })
     
     db.exams.update_one(
         {"exam": exam_name, "provider": provider},
-        {
-            "$set": {
-                "questions": exam_data,
-                "metadata": {
-                    "sessionTime": session_time,
-                    "totalQuestions": total_questions,
-                    "uploadedQuestions": uploaded_questions,
-                    "questionsPerSession": questions_per_session,
-                    "missingQuestions": missing_questions,
-                    "hasMissingQuestions": len(missing_questions) > 0
-                }
-            }
-        },
+        metadata_update_pipeline({
+            "sessionTime": session_time,
+            "totalQuestions": total_questions,
+            "questionsPerSession": questions_per_session,
+            **question_state_metadata(db, exam_name, provider)
+        }),
         upsert=True
     )
     # Clear the cache after saving new data
     get_exam_list.clear()
-    get_exam.clear()
+    invalidate_exam(exam_name, provider)
+    return removed.deleted_count
 
-def update_exam_questions(exam_name: str, provider: str, questions: List[Dict]):
+def update_exam_questions(exam_name: str, provider: str, questions: List[Dict],
+                          expected_version: Optional[int] = None) -> bool:
+    """Replace an exam's questions; raises ConcurrentModificationError if
+    expected_version no longer matches metadata.version"""
     db = get_database()
-    # Get current exam data first
-    exam = db.exams.find_one({"exam": exam_name, "provider": provider})
-    if not exam:
-        return False
-    
-    # Update questions while preserving metadata
+    # Claim the new version and metadata in one atomic update before touching the questions
     result = db.exams.update_one(
-        {"exam": exam_name, "provider": provider},
-        {
-            "$set": {
-                "questions": questions,
-                "metadata": exam["metadata"]  # Preserve existing metadata
-            }
-        }
+        exam_filter(exam_name, provider, expected_version),
+        metadata_update_pipeline(question_state(questions))
     )
+    if not result.matched_count:
+        check_version_conflict(db, exam_name, provider)
+        return False
+    
+    write_questions(db, exam_name, provider, questions)
+    db.questions.delete_many({
+        "exam": exam_name,
+        "provider": provider,
+        "questionNumber": {"$nin": [q["questionNumber"] for q in questions]}
+    })
     # Clear cache to reflect changes
-    get_exam.clear()
-    return result.modified_count > 0
+    invalidate_exam(exam_name, provider)
+    return True
 
-def update_exam_metadata(exam_name: str, provider: str, session_time: int, total_questions: int, questions_per_session: int):
+def update_exam_metadata(exam_name: str, provider: str, session_time: int, total_questions: int,
+                         questions_per_session: int, expected_version: Optional[int] = None) -> bool:
+    """Change an exam's settings; raises ConcurrentModificationError if
+    expected_version no longer matches metadata.version"""
     db = get_database()
-    exam = db.exams.find_one({"exam": exam_name, "provider": provider})
-    if not exam:
-        return False
-    
-    # Recalculate missing questions with new total_questions value
-    missing_questions = find_missing_questions(exam["questions"], total_questions)
-    
+    # Missing questions are recomputed from the stored question order, no questions are read
     result = db.exams.update_one(
-        {"exam": exam_name, "provider": provider},
-        {
-            "$set": {
-                "metadata": {
-                    "sessionTime": session_time,
-                    "totalQuestions": total_questions,
-                    "questionsPerSession": questions_per_session,
-                    "uploadedQuestions": len(exam["questions"]),
-                    "missingQuestions": missing_questions,
-                    "hasMissingQuestions": len(missing_questions) > 0
-                }
-            }
-        }
+        exam_filter(exam_name, provider, expected_version),
+        metadata_update_pipeline({
+            "sessionTime": session_time,
+            "totalQuestions": total_questions,
+            "questionsPerSession": questions_per_session
+        })
     )
-    get_exam.clear()
-    return result.modified_count > 0
+    if not result.matched_count:
+        check_version_conflict(db, exam_name, provider)
+        return False
+    # Question content is unchanged, only the cached exam documents carry metadata
+    get_exam.invalidate(exam_name, provider)
+    get_exam_light.invalidate(exam_name, provider)
+    get_exam_metadata.invalidate(exam_name, provider)
+    return True
 
 def update_single_question(exam_name: str, provider: str, question_number: int, 
                          verified_answer: str, is_marked: bool) -> bool:
     try:
         db = get_database()
-        result = db.exams.update_one(
-            {
-                "exam": exam_name, 
-                "provider": provider,
-            },
+        previous = db.questions.find_one_and_update(
+            question_key(exam_name, provider, question_number),
             {
                 "$set": {
-                    "questions.$[q].verifiedAnswer": verified_answer,
-                    "questions.$[q].isMarked": is_marked
+                    "verifiedAnswer": verified_answer,
+                    "isMarked": is_marked
                 }
             },
-            array_filters=[{"q.questionNumber": question_number}]
+            projection={"_id": 0, "verifiedAnswer": 1, "isMarked": 1},
+            return_document=ReturnDocument.BEFORE
         )
-        # Clear exam cache after update
-        get_exam.clear()
+        if previous is None:
+            return False
+        
+        # Keep the metadata counters current without rescanning the questions
+        verified_delta = int(bool(verified_answer)) - int(bool(previous.get("verifiedAnswer")))
+        marked_update = "$addToSet" if is_marked else "$pull"
+        db.exams.update_one(
+            {"exam": exam_name, "provider": provider},
+            {
+                "$inc": {"metadata.verifiedCount": verified_delta},
+                marked_update: {"metadata.markedQuestions": question_number}
+            }
+        )
+        
+        # Patch the cached exams in place instead of refetching them
+        def apply_update(exam: Dict):
+            meta = exam["metadata"]
+            meta["verifiedCount"] = meta.get("verifiedCount", 0) + verified_delta
+            marked = [n for n in meta.get("markedQuestions", []) if n != question_number]
+            meta["markedQuestions"] = marked + [question_number] if is_marked else marked
+            for q in exam["questions"]:
+                if q["questionNumber"] == question_number:
+                    q["verifiedAnswer"] = verified_answer
+                    q["isMarked"] = is_marked
+                    break
+        get_exam.patch(exam_name, provider, update=apply_update)
+        get_exam_light.patch(exam_name, provider, update=apply_update)
+        get_exam_metadata.invalidate(exam_name, provider)
+        
+        def replace_stored_question(store: Dict):
+            # Stored questions are read-only, swap in an updated copy
+            if question_number in store:
+                store[question_number] = freeze({
+                    **store[question_number],
+                    "verifiedAnswer": verified_answer,
+                    "isMarked": is_marked
+                })
+        get_question_store.patch(exam_name, provider, update=replace_stored_question)
         return True
     except Exception as e:
         print(f"Error updating question: {e}")
         return False
 
-@st.cache_data(ttl=600)
-def get_note(email: str, exam_name: str, provider: str, question_number: int) -> str:
+def bulk_update_questions(exam_name: str, provider: str, updates: Dict[int, Dict]) -> Optional[Dict]:
+    """Set verifiedAnswer and/or isMarked on many questions in one round trip.
+
+    Returns how many of the given questions exist in the exam and how many
+    changed, or None if the update failed.
+    """
     try:
         db = get_database()
-        note = db.notes.find_one({
-            "email": email,
-            "exam": exam_name,
-            "provider": provider,
-            "questionNumber": question_number
-        })
-        return note["text"] if note else ""
+        if not db.exams.count_documents({"exam": exam_name, "provider": provider}, limit=1):
+            return None
+        previous = {
+            q["questionNumber"]: q
+            for q in db.questions.find(
+                {"exam": exam_name, "provider": provider, "questionNumber": {"$in": list(updates)}},
+                {"_id": 0, "questionNumber": 1, "verifiedAnswer": 1, "isMarked": 1}
+            )
+        }
+        result = db.questions.bulk_write([
+            UpdateOne(question_key(exam_name, provider, question_number), {"$set": fields})
+            for question_number, fields in updates.items()
+        ], ordered=False)
+        
+        # Apply only the changes to the counters, like update_single_question does, so
+        # concurrent single-question edits are not overwritten by a stale recount
+        verified_delta = 0
+        marked, unmarked = [], []
+        for question_number, old in previous.items():
+            new = {**old, **updates[question_number]}
+            verified_delta += int(bool(new.get("verifiedAnswer"))) - int(bool(old.get("verifiedAnswer")))
+            (marked if new.get("isMarked", False) else unmarked).append(question_number)
+        db.exams.update_one(
+            {"exam": exam_name, "provider": provider},
+            [{"$set": {
+                "metadata.verifiedCount": {"$add": [{"$ifNull": ["$metadata.verifiedCount", 0]}, verified_delta]},
+                "metadata.markedQuestions": {"$sortArray": {
+                    "input": {"$setUnion": [
+                        {"$setDifference": [{"$ifNull": ["$metadata.markedQuestions", []]},
+                                            {"$literal": unmarked}]},
+                        {"$literal": marked}
+                    ]},
+                    "sortBy": 1
+                }},
+                "metadata.version": {"$add": [{"$ifNull": ["$metadata.version", 0]}, 1]}
+            }}]
+        )
+        invalidate_exam(exam_name, provider)
+        return {"matched": result.matched_count, "modified": result.modified_count}
     except Exception as e:
-        print(f"Error getting note: {e}")
-        return ""
+        print(f"Error updating questions: {e}")
+        return None
+
+def search_questions(query: str, limit: int = SEARCH_RESULT_LIMIT) -> List[Dict]:
+    """Questions of every exam matching query in the question_search text index, best first"""
+    try:
+        db = get_database()
+        return list(db.questions.find(
+            {"$text": {"$search": query}},
+            {"_id": 0, "exam": 1, "provider": 1, "questionNumber": 1, "questionText": 1,
+             "score": {"$meta": "textScore"}}
+        ).sort([("score", {"$meta": "textScore"})]).limit(limit))
+    except Exception as e:
+        print(f"Error searching questions: {e}")
+        return []
+
+def search_notes(email: str, query: str, limit: int = SEARCH_RESULT_LIMIT) -> List[Dict]:
+    """A user's notes matching query, best first"""
+    try:
+        db = get_database()
+        return list(db.notes.find(
+            {"email": email, "$text": {"$search": query}},
+            {"_id": 0, "exam": 1, "provider": 1, "questionNumber": 1, "text": 1,
+             "score": {"$meta": "textScore"}}
+        ).sort([("score", {"$meta": "textScore"})]).limit(limit))
+    except Exception as e:
+        print(f"Error searching notes: {e}")
+        return []
+
+@keyed_cache(ttl=600)
+def get_exam_notes(email: str, exam_name: str, provider: str) -> Dict[int, str]:
+    """All of a user's notes for one exam as {questionNumber: text}, in one query"""
+    try:
+        db = get_database()
+        return {
+            note["questionNumber"]: note["text"]
+            for note in db.notes.find(
+                {"email": email, "exam": exam_name, "provider": provider},
+                {"_id": 0, "questionNumber": 1, "text": 1}
+            )
+        }
+    except Exception as e:
+        print(f"Error getting exam notes: {e}")
+        return {}
 
 def save_note(email: str, exam_name: str, provider: str, question_number: int, note_text: str) -> bool:
     try:
@@ -152,8 +403,10 @@ def save_note(email: str, exam_name: str, provider: str, question_number: int, n
             },
             upsert=True
         )
-        # Clear the specific note from cache
-        get_note.clear()
+        # Update the note in the cached note map of its exam
+        get_exam_notes.patch(email, exam_name, provider,
+                             update=lambda notes: notes.__setitem__(question_number, note_text))
+        get_all_user_notes.invalidate(email)
         return True
     except Exception as e:
         print(f"Error saving note: {e}")
@@ -164,28 +417,173 @@ def get_exam_list():
     db = get_database()
     return list(db.exams.find({}, {"exam": 1, "provider": 1}))
 
-@st.cache_data(ttl=600)
-def get_exam(exam_name: str, provider: str):
+def load_exam(exam_name: str, provider: str, question_projection: Dict):
     db = get_database()
     result = db.exams.find_one({"exam": exam_name, "provider": provider})
-    return result if result else None
+    if not result:
+        return None
+    result["questions"] = list(db.questions.find(
+        {"exam": exam_name, "provider": provider}, question_projection
+    ).sort("questionNumber", 1))
+    return result
 
-@st.cache_data(ttl=600)
-def get_user_exam_attempts(email: str, exam_name: str, provider: str):
+@keyed_cache(ttl=600)
+def get_exam(exam_name: str, provider: str):
+    return load_exam(exam_name, provider, {"_id": 0})
+
+@keyed_cache(ttl=600)
+def get_exam_light(exam_name: str, provider: str):
+    """Exam with question text and options only, without comments and votes"""
+    return load_exam(exam_name, provider, LIGHT_QUESTION_PROJECTION)
+
+@keyed_cache(ttl=600)
+def get_exam_metadata(exam_name: str, provider: str) -> Optional[Dict]:
+    """An exam's metadata without its question order or any questions"""
+    db = get_database()
+    # The question order is excluded by the server, so it is never transferred
+    exam = db.exams.find_one({"exam": exam_name, "provider": provider},
+                             {"_id": 0, "metadata.questionOrder": 0})
+    if not exam:
+        return None
+    return exam.get("metadata", {})
+
+def get_batch_question_numbers(exam_name: str, provider: str, start: int, count: int) -> List[int]:
+    """Numbers of the questions at positions start..start+count in question order, sliced by the server"""
+    db = get_database()
+    batch = list(db.exams.aggregate([
+        {"$match": {"exam": exam_name, "provider": provider}},
+        {"$project": {"_id": 0, "questionNumbers": {"$slice": ["$metadata.questionOrder", start, count]}}}
+    ]))
+    return batch[0]["questionNumbers"] if batch else []
+
+def freeze(value):
+    """Read-only view of a question document: dicts become mapping proxies, lists tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+@keyed_cache(ttl=600, copy_values=False)
+def get_question_store(exam_name: str, provider: str) -> Dict[int, Mapping]:
+    """Process-wide questionNumber -> read-only light question, shared by all sessions.
+
+    Starts empty and is filled on demand by get_shared_questions.
+    """
+    return {}
+
+def get_shared_questions(exam_name: str, provider: str,
+                         question_numbers: List[int]) -> List[Optional[Mapping]]:
+    """Read-only questions from the shared store, fetching only those not yet loaded.
+
+    Positions match question_numbers, with None for questions no longer in the exam.
+    """
+    store = get_question_store(exam_name, provider)
+    missing = [n for n in question_numbers if n not in store]
+    if missing:
+        db = get_database()
+        for question in db.questions.find(
+            {"exam": exam_name, "provider": provider, "questionNumber": {"$in": missing}},
+            LIGHT_QUESTION_PROJECTION
+        ):
+            store[question["questionNumber"]] = freeze(question)
+    return [store.get(n) for n in question_numbers]
+
+@keyed_cache(ttl=600)
+def get_question_details(exam_name: str, provider: str, question_number: int) -> Dict:
+    """Comments, vote distribution and suggested answer for a single question"""
+    db = get_database()
+    projection = {"_id": 0, **{field: 1 for field in QUESTION_DETAIL_FIELDS}}
+    details = db.questions.find_one(question_key(exam_name, provider, question_number), projection)
+    return details or {}
+
+def invalidate_exam(exam_name: str, provider: str):
+    get_exam.invalidate(exam_name, provider)
+    get_exam_light.invalidate(exam_name, provider)
+    get_exam_metadata.invalidate(exam_name, provider)
+    get_question_store.invalidate(exam_name, provider)
+    get_question_details.invalidate_prefix(exam_name, provider)
+
+def clear_exam_cache():
+    get_exam.clear()
+    get_exam_light.clear()
+    get_exam_metadata.clear()
+    get_question_store.clear()
+    get_question_details.clear()
+
+# Everything shown in attempt lists; the per-question answers are fetched separately
+ATTEMPT_SUMMARY_PROJECTION = {
+    "exam": 1,
+    "provider": 1,
+    "score": 1, 
+    "completed_at": 1, 
+    "duration_minutes": 1, 
+    "batch_number": 1, 
+    "batch_range": 1
+}
+
+@keyed_cache(ttl=600)
+def get_user_exam_attempts(email: str, exam_name: str, provider: str, limit: int = 0):
+    """Attempt summaries for one exam, newest first; limit=0 returns all of them"""
     db = get_database()
     attempts = db.progress.find(
         {"email": email, "exam": exam_name, "provider": provider},
-        {
-            "score": 1, 
-            "completed_at": 1, 
-            "duration_minutes": 1, 
-            "batch_number": 1, 
-            "batch_range": 1,
-            "answers": 1  # Add answers field to query projection
-        }
+        ATTEMPT_SUMMARY_PROJECTION
+    ).sort("completed_at", -1).limit(limit)
+    return list(attempts)
+
+@keyed_cache(ttl=600)
+def get_all_user_attempts(email: str):
+    """Attempt summaries across every exam, newest first, in a single indexed query"""
+    db = get_database()
+    attempts = db.progress.find(
+        {"email": email},
+        ATTEMPT_SUMMARY_PROJECTION
     ).sort("completed_at", -1)
     return list(attempts)
 
+@keyed_cache(ttl=600)
+def get_attempt_answers(attempt_id) -> List[Dict]:
+    db = get_database()
+    attempt = db.progress.find_one({"_id": attempt_id}, {"answers": 1})
+    return attempt.get("answers", []) if attempt else []
+
+def question_stats_updates(email: str, exam_name: str, provider: str,
+                           answers: List[Dict], completed_at: datetime) -> List[UpdateOne]:
+    """Upserts that fold one attempt's answers into the per-question statistics"""
+    return [
+        UpdateOne(
+            {"email": email, **question_key(exam_name, provider, a["questionNumber"])},
+            {
+                "$inc": {
+                    "attempts": 1,
+                    "correct": int(a["correct"]),
+                    "incorrect": int(not a["correct"])
+                },
+                "$set": {"lastSeen": completed_at, "lastResult": a["correct"]}
+            },
+            upsert=True
+        )
+        for a in answers
+    ]
+
+def review_schedule_updates(email: str, exam_name: str, provider: str, answers: List[Dict],
+                            completed_at: datetime, states: Dict[int, Dict]) -> List[UpdateOne]:
+    """Upserts that advance each answered question's spaced-repetition schedule.
+
+    `states` holds the current schedule by question number and is updated in place.
+    """
+    updates = []
+    for a in answers:
+        state = next_review(states.get(a["questionNumber"]), a["correct"], completed_at)
+        states[a["questionNumber"]] = state
+        updates.append(UpdateOne(
+            {"email": email, **question_key(exam_name, provider, a["questionNumber"])},
+            {"$set": state},
+            upsert=True
+        ))
+    return updates
+
 def save_user_progress(email: str, exam_name: str, provider: str, progress_data: Dict):
     db = get_database()
     db.progress.insert_one({  # Changed from update_one to insert_one for multiple attempts
@@ -194,10 +592,83 @@ def save_user_progress(email: str, exam_name: str, provider: str, progress_data:
         "provider": provider,
         **progress_data
     })
-    # Clear the cache
-    get_user_exam_attempts.clear()
+    stats_updates = question_stats_updates(email, exam_name, provider,
+                                           progress_data.get("answers", []),
+                                           progress_data["completed_at"])
+    if stats_updates:
+        db.question_stats.bulk_write(stats_updates, ordered=False)
+    
+    answers = progress_data.get("answers", [])
+    if answers:
+        states = {
+            state["questionNumber"]: state
+            for state in db.review_schedule.find(
+                {"email": email, "exam": exam_name, "provider": provider,
+                 "questionNumber": {"$in": [a["questionNumber"] for a in answers]}},
+                {"_id": 0, "questionNumber": 1, "easiness": 1, "repetitions": 1, "interval": 1}
+            )
+        }
+        db.review_schedule.bulk_write(
+            review_schedule_updates(email, exam_name, provider, answers,
+                                    progress_data["completed_at"], states),
+            ordered=False
+        )
+    # Clear the cache for this exam only
+    get_user_exam_attempts.invalidate_prefix(email, exam_name, provider)
+    get_review_session.invalidate_prefix(email, exam_name, provider)
+    get_all_user_attempts.invalidate(email)
+    get_weak_questions.invalidate_prefix(email, exam_name, provider)
 
-@st.cache_data(ttl=600)
+@keyed_cache(ttl=600)
+def get_weak_questions(email: str, exam_name: str, provider: str, limit: int = 10) -> List[Dict]:
+    """Questions the user has answered wrong most often, from the question_stats collection"""
+    db = get_database()
+    stats = db.question_stats.find(
+        {"email": email, "exam": exam_name, "provider": provider, "incorrect": {"$gt": 0}},
+        {"_id": 0, "email": 0}
+    ).sort("incorrect", -1).limit(limit)
+    return list(stats)
+
+@keyed_cache(ttl=600)
+def get_review_session(email: str, exam_name: str, provider: str, size: int) -> Dict:
+    """Question numbers for a spaced-repetition session: overdue reviews first, earliest
+    due first, then questions the user has never answered, in question order"""
+    db = get_database()
+    now = datetime.now()
+    user_exam = {"email": email, "exam": exam_name, "provider": provider}
+    due = [
+        state["questionNumber"]
+        for state in db.review_schedule.find(
+            {**user_exam, "due": {"$lte": now}}, {"_id": 0, "questionNumber": 1}
+        ).sort("due", 1).limit(size)
+    ]
+    # Walk the question order in slices, so each lookup is bounded by the slice size;
+    # skip the walk when every question already has a schedule
+    exam = db.exams.find_one({"exam": exam_name, "provider": provider},
+                             {"_id": 0, "metadata.uploadedQuestions": 1}) or {}
+    uploaded = exam.get("metadata", {}).get("uploadedQuestions", 0)
+    scheduled_count = db.review_schedule.count_documents(user_exam)
+    batches = REVIEW_SCAN_MAX_BATCHES if scheduled_count < uploaded else 0
+    new = []
+    start = 0
+    for _ in range(batches):
+        if len(due) + len(new) >= size:
+            break
+        numbers = get_batch_question_numbers(exam_name, provider, start, REVIEW_SCAN_BATCH_SIZE)
+        if not numbers:
+            break
+        scheduled = set(db.review_schedule.distinct(
+            "questionNumber", {**user_exam, "questionNumber": {"$in": numbers}}
+        ))
+        new += [n for n in numbers if n not in scheduled][:size - len(due) - len(new)]
+        start += len(numbers)
+    next_due = None
+    if not due:
+        upcoming = db.review_schedule.find_one(user_exam, {"_id": 0, "due": 1}, sort=[("due", 1)])
+        next_due = upcoming["due"] if upcoming else None
+    return {"due": due, "new": new, "nextDue": next_due}
+
+@keyed_cache(ttl=600)
 def get_all_user_notes(email: str):
     try:
         db = get_database()
@@ -210,8 +681,76 @@ def get_all_user_notes(email: str):
                 "text": 1,
                 "_id": 0
             }
-        ).sort([("exam", 1), ("questionNumber", 1)])
+        ).sort([("exam", 1), ("provider", 1), ("questionNumber", 1)])
         return list(notes)
     except Exception as e:
         print(f"Error getting notes: {e}")
         return []
+
+@keyed_cache(ttl=600)
+def get_attempt_checkpoint(email: str, exam_name: str, provider: str):
+    db = get_database()
+    return db.attempts_in_progress.find_one(
+        {"email": email, "exam": exam_name, "provider": provider}, {"_id": 0}
+    )
+
+def save_attempt_checkpoint(email: str, exam_name: str, provider: str, checkpoint: Dict):
+    db = get_database()
+    db.attempts_in_progress.replace_one(
+        {"email": email, "exam": exam_name, "provider": provider},
+        {
+            "email": email,
+            "exam": exam_name,
+            "provider": provider,
+            **checkpoint,
+            "updated_at": datetime.now()
+        },
+        upsert=True
+    )
+    get_attempt_checkpoint.invalidate(email, exam_name, provider)
+
+def delete_attempt_checkpoint(email: str, exam_name: str, provider: str):
+    db = get_database()
+    db.attempts_in_progress.delete_one({"email": email, "exam": exam_name, "provider": provider})
+    get_attempt_checkpoint.invalidate(email, exam_name, provider)
+
+def load_token_cache() -> bytes:
+    db = get_database()
+    doc = db.token_cache.find_one({"_id": "msal"})
+    return doc["state"] if doc else b""
+
+def save_token_cache(state: bytes):
+    db = get_database()
+    db.token_cache.update_one(
+        {"_id": "msal"},
+        {"$set": {"state": state, "updated_at": datetime.now()}},
+        upsert=True
+    )
+
+def get_image_manifest(folder_name: str) -> Dict:
+    """Remote folder id and the content hash and item id of every file uploaded to it"""
+    db = get_database()
+    folder = db.image_folders.find_one({"_id": folder_name})
+    files = db.image_manifest.find({"folder": folder_name}, {"_id": 0, "folder": 0})
+    return {
+        "folderId": folder["folderId"] if folder else None,
+        "files": {f["filename"]: f for f in files}
+    }
+
+def save_image_manifest(folder_name: str, folder_id: str, entries: Dict[str, Dict]):
+    """Record uploaded files, entries maps filename to {"contentHash", "itemId"}"""
+    db = get_database()
+    db.image_folders.update_one(
+        {"_id": folder_name},
+        {"$set": {"folderId": folder_id, "updated_at": datetime.now()}},
+        upsert=True
+    )
+    if entries:
+        db.image_manifest.bulk_write([
+            UpdateOne(
+                {"folder": folder_name, "filename": filename},
+                {"$set": {**entry, "uploaded_at": datetime.now()}},
+                upsert=True
+            )
+            for filename, entry in entries.items()
+        ], ordered=False)
@@ -0,0 +1,259 @@
+import codecs
+import csv
+import io
+import json
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Union
+from database import QUESTION_BATCH_SIZE, save_exam_questions, merge_exam_questions, save_exam_metadata
+
+# Bytes read from the upload per parser refill
+READ_CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+# Characters that can follow a complete array element
+_ELEMENT_END = frozenset(" \t\r\n,]")
+
+
+def iter_json_array(file: BinaryIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator:
+    """Yield the elements of a top-level JSON array one at a time.
+
+    Only the element being parsed is held in memory, so the whole upload is
+    never turned into Python objects at once.
+    """
+    text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def refill():
+        nonlocal buffer, pos, eof
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + text_decoder.decode(chunk, final=eof)
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            refill()
+
+    def next_char() -> str:
+        nonlocal pos
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError("Unexpected end of file inside the question array")
+        pos += 1
+        return buffer[pos - 1]
+
+    def expect_end():
+        skip_whitespace()
+        if pos < len(buffer):
+            raise ValueError("Unexpected data after the question array")
+
+    skip_whitespace()
+    if pos >= len(buffer) or buffer[pos] != "[":
+        raise ValueError("Expected a JSON array of questions")
+    pos += 1
+    skip_whitespace()
+    if pos < len(buffer) and buffer[pos] == "]":
+        pos += 1
+        expect_end()
+        return
+
+    while True:
+        skip_whitespace()
+        # Grow the buffer until the next element parses completely
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buffer, pos)
+                # A number could still continue in the next chunk, e.g. "1." or "1e"
+                if eof or (end < len(buffer) and buffer[end] in _ELEMENT_END):
+                    break
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ValueError(f"Invalid JSON: {e.msg}") from e
+            refill()
+        pos = end
+        yield value
+
+        separator = next_char()
+        if separator == "]":
+            expect_end()
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or ']' in the question array, found {separator!r}")
+
+
+def validate_question(question) -> Dict:
+    """Check one uploaded question record and return it, raising ValueError if malformed"""
+    if not isinstance(question, dict):
+        raise ValueError("Each question must be a JSON object")
+
+    number = question.get("questionNumber")
+    if not isinstance(number, int) or isinstance(number, bool) or number < 1:
+        raise ValueError(f"Invalid questionNumber: {number!r}")
+
+    for field in ("exam", "provider", "questionText"):
+        if not isinstance(question.get(field), str):
+            raise ValueError(f"Question {number}: '{field}' must be a string")
+
+    options = question.get("options")
+    if not isinstance(options, list) or not options:
+        raise ValueError(f"Question {number}: 'options' must be a non-empty list")
+    for option in options:
+        if not (isinstance(option, dict)
+                and isinstance(option.get("optionLetter"), str)
+                and isinstance(option.get("optionText"), str)):
+            raise ValueError(f"Question {number}: every option needs optionLetter and optionText")
+
+    comments = question.get("comments", [])
+    if not isinstance(comments, list):
+        raise ValueError(f"Question {number}: 'comments' must be a list")
+    for comment in comments:
+        if not (isinstance(comment, dict)
+                and isinstance(comment.get("commentHead"), str)
+                and isinstance(comment.get("commentContent"), str)):
+            raise ValueError(f"Question {number}: every comment needs commentHead and commentContent")
+
+    return question
+
+
+def iter_exam_questions(file: BinaryIO) -> Iterator[Dict]:
+    """Stream validated questions, checking they all belong to one exam and are unique"""
+    exam_key = None
+    seen = set()
+    for question in iter_json_array(file):
+        validate_question(question)
+        key = (question["exam"], question["provider"])
+        if exam_key is None:
+            exam_key = key
+        elif key != exam_key:
+            raise ValueError(f"Question {question['questionNumber']} belongs to "
+                             f"{key[0]} - {key[1]}, expected {exam_key[0]} - {exam_key[1]}")
+        if question["questionNumber"] in seen:
+            raise ValueError(f"Duplicate questionNumber: {question['questionNumber']}")
+        seen.add(question["questionNumber"])
+        yield question
+
+
+def scan_exam_file(file: BinaryIO) -> Dict:
+    """Validate an upload without keeping its questions; returns exam, provider and count"""
+    exam_name = provider = None
+    count = 0
+    for question in iter_exam_questions(file):
+        exam_name, provider = question["exam"], question["provider"]
+        count += 1
+    if not count:
+        raise ValueError("The uploaded file contains no questions")
+    return {"exam": exam_name, "provider": provider, "count": count}
+
+
+def import_exam(file: BinaryIO, session_time: int, total_questions: int,
+                questions_per_session: int,
+                progress: Optional[Callable[[int], None]] = None,
+                incremental: bool = False) -> Dict[str, int]:
+    """Stream questions into the database in bounded batches, then save the metadata.
+
+    With `incremental`, only new or changed questions are written and the
+    verified answers and marks already stored are kept. Returns the number of
+    questions imported and removed, plus the added/changed/unchanged counts
+    in incremental mode.
+    """
+    exam_name = provider = None
+    question_numbers: List[int] = []
+    batch: List[Dict] = []
+    summary = {"added": 0, "changed": 0, "unchanged": 0} if incremental else {}
+
+    def flush():
+        if incremental:
+            for key, count in merge_exam_questions(exam_name, provider, batch).items():
+                summary[key] += count
+        else:
+            save_exam_questions(exam_name, provider, batch)
+        batch.clear()
+        if progress:
+            progress(len(question_numbers))
+
+    for question in iter_exam_questions(file):
+        exam_name, provider = question["exam"], question["provider"]
+        question_numbers.append(question["questionNumber"])
+        batch.append(question)
+        if len(batch) >= QUESTION_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+    if not question_numbers:
+        raise ValueError("The uploaded file contains no questions")
+
+    removed = save_exam_metadata(exam_name, provider, question_numbers,
+                                 session_time, total_questions, questions_per_session)
+    return {"questions": len(question_numbers), "removed": removed, **summary}
+
+
+_TRUE_VALUES = {"true", "yes", "y", "1", "x"}
+_FALSE_VALUES = {"false", "no", "n", "0"}
+
+
+def parse_marked(value: Union[str, bool, int], question_number: int) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE_VALUES:
+        return True
+    if text in _FALSE_VALUES:
+        return False
+    raise ValueError(f"Question {question_number}: isMarked must be true or false, got {value!r}")
+
+
+def answer_key_entry(record: Dict) -> Dict:
+    """Question number and fields to set from one answer key row; blank cells are left unchanged"""
+    try:
+        question_number = int(str(record.get("questionNumber", "")).strip())
+    except ValueError:
+        raise ValueError(f"Invalid questionNumber: {record.get('questionNumber')!r}") from None
+
+    fields = {}
+    answer = str(record.get("verifiedAnswer") or "").strip().upper()
+    if answer:
+        fields["verifiedAnswer"] = answer
+    if record.get("isMarked") not in (None, ""):
+        fields["isMarked"] = parse_marked(record["isMarked"], question_number)
+    return {"questionNumber": question_number, "fields": fields}
+
+
+def parse_answer_key(file: BinaryIO, filename: str) -> Dict[int, Dict]:
+    """Read a CSV or JSON answer key into {questionNumber: {verifiedAnswer, isMarked}}.
+
+    CSV needs a questionNumber column plus verifiedAnswer and/or isMarked.
+    JSON is either a list of such records or an object mapping question
+    numbers to an answer string or to a record.
+    """
+    if filename.lower().endswith(".csv"):
+        text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+        records = list(csv.DictReader(text))
+    else:
+        data = json.load(file)
+        if isinstance(data, dict):
+            records = [
+                {"questionNumber": number, **(value if isinstance(value, dict) else {"verifiedAnswer": value})}
+                for number, value in data.items()
+            ]
+        elif isinstance(data, list) and all(isinstance(record, dict) for record in data):
+            records = data
+        else:
+            raise ValueError("Expected a JSON object or a list of answer records")
+
+    updates = {}
+    for record in records:
+        entry = answer_key_entry(record)
+        if not entry["fields"]:
+            continue
+        if entry["questionNumber"] in updates:
+            raise ValueError(f"Duplicate questionNumber: {entry['questionNumber']}")
+        updates[entry["questionNumber"]] = entry["fields"]
+    if not updates:
+        raise ValueError("The answer key is empty")
+    return updates
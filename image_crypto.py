@@ -0,0 +1,110 @@
+"""Chunked AES-GCM encryption for exam images.
+
+Stream layout (version 1):
+
+    header  = MAGIC (4) | version (1) | chunk size (4) | nonce prefix (7)
+    frame   = final flag (1) | ciphertext length (4) | ciphertext + 16-byte tag
+
+Each frame is a separate AES-GCM message. Its nonce is the nonce prefix,
+the 4-byte frame counter and the final flag, and the header is the
+associated data. Frames therefore cannot be reordered, dropped, truncated
+or moved between files without failing authentication.
+
+Blobs written before this format (12-byte nonce followed by a single
+AES-GCM ciphertext) are still decrypted by `decrypt_stream`/`decrypt_image`.
+"""
+import io
+import secrets
+import struct
+from typing import BinaryIO
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+MAGIC = b"QMEI"
+VERSION = 1
+CHUNK_SIZE = 64 * 1024
+NONCE_PREFIX_SIZE = 7
+LEGACY_NONCE_SIZE = 12
+TAG_SIZE = 16
+
+_HEADER = struct.Struct(">4sBI7s")
+_FRAME = struct.Struct(">BI")
+
+
+def _frame_nonce(prefix: bytes, counter: int, final: bool) -> bytes:
+    return prefix + struct.pack(">IB", counter, int(final))
+
+
+def _read_exact(src: BinaryIO, size: int) -> bytes:
+    data = src.read(size)
+    if len(data) != size:
+        raise ValueError("Encrypted image is truncated")
+    return data
+
+
+def encrypt_stream(src: BinaryIO, dst: BinaryIO, key: bytes, chunk_size: int = CHUNK_SIZE):
+    """Encrypt src into dst one chunk at a time"""
+    aesgcm = AESGCM(key)
+    header = _HEADER.pack(MAGIC, VERSION, chunk_size, secrets.token_bytes(NONCE_PREFIX_SIZE))
+    prefix = header[-NONCE_PREFIX_SIZE:]
+    dst.write(header)
+
+    counter = 0
+    chunk = src.read(chunk_size)
+    while True:
+        # Read one chunk ahead so the last frame can be flagged as final
+        next_chunk = src.read(chunk_size) if chunk else b""
+        final = not next_chunk
+        if counter > 0xFFFFFFFF:
+            raise ValueError("Image too large for the chunked format")
+        ciphertext = aesgcm.encrypt(_frame_nonce(prefix, counter, final), chunk, header)
+        dst.write(_FRAME.pack(int(final), len(ciphertext)))
+        dst.write(ciphertext)
+        if final:
+            return
+        chunk = next_chunk
+        counter += 1
+
+
+def decrypt_stream(src: BinaryIO, dst: BinaryIO, key: bytes):
+    """Decrypt src into dst; chunked streams use constant memory, legacy blobs are read whole.
+
+    Frames are written as soon as they authenticate, so discard dst if this raises.
+    """
+    aesgcm = AESGCM(key)
+    header = src.read(_HEADER.size)
+    magic, version, chunk_size, prefix = (
+        _HEADER.unpack(header) if len(header) == _HEADER.size else (None, None, None, None)
+    )
+    if magic != MAGIC or version != VERSION:
+        # Legacy format: nonce followed by one ciphertext
+        blob = header + src.read()
+        if len(blob) < LEGACY_NONCE_SIZE + TAG_SIZE:
+            raise ValueError("Encrypted image is truncated")
+        nonce, ciphertext = blob[:LEGACY_NONCE_SIZE], blob[LEGACY_NONCE_SIZE:]
+        dst.write(aesgcm.decrypt(nonce, ciphertext, None))
+        return
+
+    counter = 0
+    while True:
+        final, length = _FRAME.unpack(_read_exact(src, _FRAME.size))
+        if final not in (0, 1) or length > chunk_size + TAG_SIZE:
+            raise ValueError("Encrypted image frame is corrupt")
+        ciphertext = _read_exact(src, length)
+        dst.write(aesgcm.decrypt(_frame_nonce(prefix, counter, bool(final)), ciphertext, header))
+        if final:
+            if src.read(1):
+                raise ValueError("Unexpected data after the final frame")
+            return
+        counter += 1
+
+
+def encrypt_image(image_bytes: bytes, key: bytes) -> bytes:
+    dst = io.BytesIO()
+    encrypt_stream(io.BytesIO(image_bytes), dst, key)
+    return dst.getvalue()
+
+
+def decrypt_image(data: bytes, key: bytes) -> bytes:
+    dst = io.BytesIO()
+    decrypt_stream(io.BytesIO(data), dst, key)
+    return dst.getvalue()
@@ -0,0 +1,67 @@
+import hashlib
+import hmac
+import tempfile
+from typing import BinaryIO, Callable, Dict, Optional
+from database import get_image_manifest, save_image_manifest
+from image_crypto import encrypt_stream
+from key_derivation import IMAGE_MANIFEST_HASH, derive_key
+from onedrive import GRAPH_URL, SIMPLE_UPLOAD_LIMIT, create_session, get_or_create_folder, upload_files
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(image: BinaryIO, key: bytes) -> str:
+    """Keyed hash of the plaintext, so the manifest does not reveal image contents"""
+    digest = hmac.new(key, digestmod=hashlib.sha256)
+    image.seek(0)
+    for chunk in iter(lambda: image.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encrypt_image_file(image: BinaryIO, key: bytes):
+    """Encrypt an image chunk by chunk; large results spill to a temporary file"""
+    encrypted = tempfile.SpooledTemporaryFile(max_size=SIMPLE_UPLOAD_LIMIT)
+    image.seek(0)
+    encrypt_stream(image, encrypted, key)
+    encrypted.seek(0)
+    return encrypted
+
+
+def sync_image_folder(folder_name: str, images: Dict[str, BinaryIO], key: bytes, access_token: str,
+                      on_progress: Optional[Callable[[str, Optional[Exception], int, int], None]] = None,
+                      base_url: str = GRAPH_URL) -> Dict:
+    """Encrypt and upload only the images that are new or changed since the last sync.
+
+    Returns the uploaded, skipped and failed filenames.
+    """
+    manifest = get_image_manifest(folder_name)
+    with create_session(1) as session:
+        folder_id = get_or_create_folder(session, folder_name, access_token, base_url)
+    # A different remote folder means the recorded uploads no longer exist
+    known_files = manifest["files"] if manifest["folderId"] == folder_id else {}
+
+    # Images are encrypted with key itself; the manifest hash uses a key derived from it
+    hash_key = derive_key(key, IMAGE_MANIFEST_HASH)
+    hashes = {name: content_hash(image, hash_key) for name, image in images.items()}
+    changed = [
+        name for name, digest in hashes.items()
+        if known_files.get(name, {}).get("contentHash") != digest
+    ]
+
+    uploaded, failed = upload_files(
+        folder_id,
+        {name: (lambda image=images[name]: encrypt_image_file(image, key)) for name in changed},
+        access_token,
+        on_progress=on_progress,
+        base_url=base_url
+    )
+    save_image_manifest(folder_name, folder_id, {
+        name: {"contentHash": hashes[name], "itemId": item_id}
+        for name, item_id in uploaded.items()
+    })
+    return {
+        "uploaded": sorted(uploaded),
+        "skipped": sorted(set(images) - set(changed)),
+        "failed": failed
+    }
@@ -0,0 +1,11 @@
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# HKDF info strings, one per use of the AES_KEY secret
+IMAGE_MANIFEST_HASH = b"quizmaker image manifest hash v1"
+TOKEN_CACHE_ENCRYPTION = b"quizmaker msal token cache v1"
+
+
+def derive_key(master_key: bytes, purpose: bytes, length: int = 32) -> bytes:
+    """Subkey of master_key for one purpose, so no key is shared between primitives"""
+    return HKDF(algorithm=hashes.SHA256(), length=length, salt=None, info=purpose).derive(master_key)
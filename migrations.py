@@ -0,0 +1,349 @@
+"""Index bootstrap, data migrations and query-plan checks for the quiz database.
+
+`bootstrap_database` runs once per process from `database.get_database`.
+Run `python migrations.py` from the project root to apply everything and
+verify that every access pattern in ACCESS_PATTERNS is served by an index.
+"""
+import sys
+from datetime import datetime
+from typing import Dict, List
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, UpdateOne
+from pymongo.errors import DuplicateKeyError
+import database
+from question_features import content_hash, extract_features
+from spaced_repetition import next_review
+
+# Indexes required by the queries in database.py, per collection
+INDEXES = {
+    "exams": [
+        IndexModel([("exam", ASCENDING), ("provider", ASCENDING)],
+                   name="exam_provider", unique=True),
+    ],
+    "questions": [
+        IndexModel([("exam", ASCENDING), ("provider", ASCENDING), ("questionNumber", ASCENDING)],
+                   name="exam_provider_question", unique=True),
+        # A collection can only have one text index, so every searchable field shares it
+        IndexModel([("plainText", TEXT), ("options.optionText", TEXT), ("comments.commentContent", TEXT)],
+                   name="question_search",
+                   weights={"plainText": 10, "options.optionText": 5, "comments.commentContent": 1}),
+    ],
+    "notes": [
+        IndexModel([("email", ASCENDING), ("exam", ASCENDING), ("provider", ASCENDING),
+                    ("questionNumber", ASCENDING)],
+                   name="email_exam_provider_question", unique=True),
+        IndexModel([("email", ASCENDING), ("text", TEXT)], name="email_note_search"),
+    ],
+    "progress": [
+        IndexModel([("email", ASCENDING), ("exam", ASCENDING), ("provider", ASCENDING),
+                    ("completed_at", DESCENDING)],
+                   name="email_exam_provider_completed"),
+        IndexModel([("email", ASCENDING), ("completed_at", DESCENDING)],
+                   name="email_completed"),
+    ],
+    "question_stats": [
+        IndexModel([("email", ASCENDING), ("exam", ASCENDING), ("provider", ASCENDING),
+                    ("questionNumber", ASCENDING)],
+                   name="email_exam_provider_question", unique=True),
+        IndexModel([("email", ASCENDING), ("exam", ASCENDING), ("provider", ASCENDING),
+                    ("incorrect", DESCENDING)],
+                   name="email_exam_provider_incorrect"),
+    ],
+    "review_schedule": [
+        IndexModel([("email", ASCENDING), ("exam", ASCENDING), ("provider", ASCENDING),
+                    ("questionNumber", ASCENDING)],
+                   name="email_exam_provider_question", unique=True),
+        IndexModel([("email", ASCENDING), ("exam", ASCENDING), ("provider", ASCENDING),
+                    ("due", ASCENDING)],
+                   name="email_exam_provider_due"),
+    ],
+    "attempts_in_progress": [
+        IndexModel([("email", ASCENDING), ("exam", ASCENDING), ("provider", ASCENDING)],
+                   name="email_exam_provider", unique=True),
+    ],
+    "image_manifest": [
+        IndexModel([("folder", ASCENDING), ("filename", ASCENDING)],
+                   name="folder_filename", unique=True),
+    ],
+}
+
+# Representative query shapes; the values only need the right types for the planner
+ACCESS_PATTERNS = [
+    {
+        "name": "get_exam",
+        "collection": "exams",
+        "filter": {"exam": "", "provider": ""},
+    },
+    {
+        "name": "get_exam questions",
+        "collection": "questions",
+        "filter": {"exam": "", "provider": ""},
+        "sort": [("questionNumber", ASCENDING)],
+    },
+    {
+        "name": "search_questions",
+        "collection": "questions",
+        "filter": {"$text": {"$search": "x"}},
+    },
+    {
+        "name": "update_single_question",
+        "collection": "questions",
+        "filter": {"exam": "", "provider": "", "questionNumber": 1},
+    },
+    {
+        "name": "save_note",
+        "collection": "notes",
+        "filter": {"email": "", "exam": "", "provider": "", "questionNumber": 1},
+    },
+    {
+        "name": "get_exam_notes",
+        "collection": "notes",
+        "filter": {"email": "", "exam": "", "provider": ""},
+    },
+    {
+        "name": "search_notes",
+        "collection": "notes",
+        "filter": {"email": "", "$text": {"$search": "x"}},
+    },
+    {
+        "name": "get_all_user_notes",
+        "collection": "notes",
+        "filter": {"email": ""},
+        "sort": [("exam", ASCENDING), ("provider", ASCENDING), ("questionNumber", ASCENDING)],
+    },
+    {
+        "name": "get_user_exam_attempts",
+        "collection": "progress",
+        "filter": {"email": "", "exam": "", "provider": ""},
+        "sort": [("completed_at", DESCENDING)],
+    },
+    {
+        "name": "get_all_user_attempts",
+        "collection": "progress",
+        "filter": {"email": ""},
+        "sort": [("completed_at", DESCENDING)],
+    },
+    {
+        "name": "get_weak_questions",
+        "collection": "question_stats",
+        "filter": {"email": "", "exam": "", "provider": "", "incorrect": {"$gt": 0}},
+        "sort": [("incorrect", DESCENDING)],
+    },
+    {
+        "name": "get_review_session",
+        "collection": "review_schedule",
+        "filter": {"email": "", "exam": "", "provider": "", "due": {"$lte": datetime(2000, 1, 1)}},
+        "sort": [("due", ASCENDING)],
+    },
+    {
+        "name": "get_attempt_checkpoint",
+        "collection": "attempts_in_progress",
+        "filter": {"email": "", "exam": "", "provider": ""},
+    },
+    {
+        "name": "get_image_manifest",
+        "collection": "image_manifest",
+        "filter": {"folder": ""},
+    },
+]
+
+
+def migrate_embedded_questions(db):
+    """Move question arrays still embedded in exam documents into the questions collection"""
+    for exam in db.exams.find({"questions": {"$exists": True}}):
+        database.write_questions(db, exam["exam"], exam["provider"], exam["questions"])
+        db.exams.update_one({"_id": exam["_id"]}, {"$unset": {"questions": ""}})
+
+
+def backfill_question_stats(db):
+    """Rebuild question_stats by replaying every attempt in progress, oldest first"""
+    db.question_stats.delete_many({})
+    attempts = db.progress.find(
+        {"answers": {"$exists": True}},
+        {"email": 1, "exam": 1, "provider": 1, "answers": 1, "completed_at": 1},
+        allow_disk_use=True
+    ).sort("completed_at", ASCENDING)
+    updates = []
+    for attempt in attempts:
+        updates.extend(database.question_stats_updates(
+            attempt["email"], attempt["exam"], attempt["provider"],
+            attempt["answers"], attempt["completed_at"]
+        ))
+        if len(updates) >= database.QUESTION_BATCH_SIZE:
+            # Ordered so a question's lastResult ends up from its latest attempt
+            db.question_stats.bulk_write(updates)
+            updates = []
+    if updates:
+        db.question_stats.bulk_write(updates)
+
+
+def backfill_question_state_metadata(db):
+    """Store verification counters and question order on exams saved before they existed"""
+    for exam in db.exams.find({}, {"exam": 1, "provider": 1}):
+        question_state = database.question_state_metadata(db, exam["exam"], exam["provider"])
+        db.exams.update_one(
+            {"_id": exam["_id"]},
+            {"$set": {f"metadata.{field}": value for field, value in question_state.items()}}
+        )
+
+
+def backfill_question_features(db):
+    """Compute derived features for questions saved before feature extraction existed"""
+    questions = db.questions.find({}, {"questionText": 1, "options": 1})
+    updates = []
+    for question in questions:
+        updates.append(UpdateOne({"_id": question["_id"]}, {"$set": extract_features(question)}))
+        if len(updates) >= database.QUESTION_BATCH_SIZE:
+            db.questions.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        db.questions.bulk_write(updates, ordered=False)
+
+
+def backfill_exam_version(db):
+    """Start the metadata version of exams saved before optimistic concurrency at 0"""
+    db.exams.update_many({"metadata.version": {"$exists": False}}, {"$set": {"metadata.version": 0}})
+
+
+def backfill_question_content_hash(db):
+    """Hash the content of questions saved before incremental re-import existed"""
+    questions = db.questions.find({"contentHash": {"$exists": False}})
+    updates = []
+    for question in questions:
+        updates.append(UpdateOne({"_id": question["_id"]}, {"$set": {"contentHash": content_hash(question)}}))
+        if len(updates) >= database.QUESTION_BATCH_SIZE:
+            db.questions.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        db.questions.bulk_write(updates, ordered=False)
+
+
+def backfill_review_schedule(db):
+    """Build spaced-repetition schedules by replaying every attempt in progress, oldest first"""
+    db.review_schedule.delete_many({})
+    attempts = db.progress.find(
+        {"answers": {"$exists": True}},
+        {"email": 1, "exam": 1, "provider": 1, "answers": 1, "completed_at": 1},
+        allow_disk_use=True
+    ).sort("completed_at", ASCENDING)
+    # Latest state per user and exam, so each question is written once at the end
+    states: Dict[tuple, Dict[int, Dict]] = {}
+    for attempt in attempts:
+        questions = states.setdefault((attempt["email"], attempt["exam"], attempt["provider"]), {})
+        for answer in attempt["answers"]:
+            questions[answer["questionNumber"]] = next_review(
+                questions.get(answer["questionNumber"]), answer["correct"], attempt["completed_at"]
+            )
+    updates = []
+    for (email, exam_name, provider), questions in states.items():
+        for question_number, state in questions.items():
+            updates.append(UpdateOne(
+                {"email": email, **database.question_key(exam_name, provider, question_number)},
+                {"$set": state},
+                upsert=True
+            ))
+            if len(updates) >= database.QUESTION_BATCH_SIZE:
+                db.review_schedule.bulk_write(updates, ordered=False)
+                updates = []
+    if updates:
+        db.review_schedule.bulk_write(updates, ordered=False)
+
+
+# Applied in order and recorded in the `migrations` collection; each must be idempotent
+MIGRATIONS = [
+    ("0001_embedded_questions", migrate_embedded_questions),
+    ("0002_question_stats", backfill_question_stats),
+    ("0003_question_state_metadata", backfill_question_state_metadata),
+    ("0004_question_features", backfill_question_features),
+    ("0005_exam_version", backfill_exam_version),
+    ("0006_question_content_hash", backfill_question_content_hash),
+    ("0007_review_schedule", backfill_review_schedule),
+    # Answer counts are now read from the instruction only, recompute them
+    ("0008_question_features_instruction", backfill_question_features),
+]
+
+
+def ensure_indexes(db):
+    for collection, indexes in INDEXES.items():
+        db[collection].create_indexes(indexes)
+
+
+def claim_migration(db, name: str) -> bool:
+    """Record name as running; False if another process already has a record for it"""
+    try:
+        db.migrations.insert_one({"_id": name, "state": "running", "started_at": datetime.now()})
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+def run_migrations(db):
+    """Apply pending migrations in order, claiming each one so concurrent processes skip it.
+
+    A process that finds a migration claimed by another one stops, since the
+    later migrations depend on it; the claiming process applies the rest. A
+    claim left by a process that died mid-migration has to be deleted by hand.
+    """
+    # Records without a state predate claiming and were applied
+    states = {m["_id"]: m.get("state", "done") for m in db.migrations.find({}, {"state": 1})}
+    for name, migrate in MIGRATIONS:
+        if states.get(name) == "done":
+            continue
+        if not claim_migration(db, name):
+            print(f"Migration {name} is being applied by another process")
+            return
+        try:
+            migrate(db)
+        except Exception:
+            # Release the claim so the next start retries
+            db.migrations.delete_one({"_id": name, "state": "running"})
+            raise
+        db.migrations.update_one(
+            {"_id": name},
+            {"$set": {"state": "done", "applied_at": datetime.now()}}
+        )
+
+
+def bootstrap_database(db):
+    ensure_indexes(db)
+    run_migrations(db)
+
+
+def plan_stages(plan) -> List[str]:
+    """All stage names in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+
+def explain_access_pattern(db, pattern: Dict) -> List[str]:
+    cursor = db[pattern["collection"]].find(pattern["filter"])
+    if pattern.get("sort"):
+        cursor = cursor.sort(pattern["sort"])
+    return plan_stages(cursor.explain()["queryPlanner"]["winningPlan"])
+
+
+def verify_query_plans(db):
+    """Raise RuntimeError if any access pattern falls back to a collection scan"""
+    failures = [
+        pattern["name"] for pattern in ACCESS_PATTERNS
+        if "COLLSCAN" in explain_access_pattern(db, pattern)
+    ]
+    if failures:
+        raise RuntimeError(f"Collection scan used by: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    db = database.get_database()
+    try:
+        verify_query_plans(db)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+    print(f"All {len(ACCESS_PATTERNS)} access patterns use an index")
@@ -0,0 +1,189 @@
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import BinaryIO, Callable, Dict, Optional, Tuple, Union
+import requests
+from requests.adapters import HTTPAdapter
+
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+# Files above this size go through an upload session (Graph's simple upload limit is 4 MB)
+SIMPLE_UPLOAD_LIMIT = 4 * 1024 * 1024
+# Upload session chunks must be a multiple of 320 KiB
+UPLOAD_CHUNK_SIZE = 10 * 320 * 1024
+MAX_WORKERS = 4
+MAX_RETRIES = 4
+RETRY_BACKOFF_SECONDS = 1.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+REQUEST_TIMEOUT = 60
+
+
+def create_session(pool_size: int = MAX_WORKERS) -> requests.Session:
+    """Session whose connection pool is large enough for every upload worker"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def retry_delay(attempt: int, response: Optional[requests.Response]) -> float:
+    """Honor Retry-After when the service sends it, otherwise back off exponentially"""
+    if response is not None and response.headers.get("Retry-After", "").isdigit():
+        return float(response.headers["Retry-After"])
+    return RETRY_BACKOFF_SECONDS * (2 ** attempt)
+
+
+def request_with_retry(session: requests.Session, method: str, url: str, **kwargs) -> requests.Response:
+    """Send a request, retrying throttling, server errors and dropped connections"""
+    for attempt in range(MAX_RETRIES + 1):
+        response = None
+        try:
+            response = session.request(method, url, timeout=REQUEST_TIMEOUT, **kwargs)
+            if response.status_code not in RETRY_STATUSES:
+                response.raise_for_status()
+                return response
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == MAX_RETRIES:
+                raise
+        if attempt == MAX_RETRIES:
+            response.raise_for_status()
+        time.sleep(retry_delay(attempt, response))
+
+
+def find_folder(session: requests.Session, folder_name: str, headers: Dict,
+                base_url: str = GRAPH_URL) -> Optional[str]:
+    """Id of the folder with this name in the drive root, or None if there is none"""
+    try:
+        resp = request_with_retry(
+            session, "GET", f"{base_url}/me/drive/root:/{requests.utils.quote(folder_name)}",
+            headers=headers
+        )
+        return resp.json()["id"]
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            raise
+    return None
+
+
+def get_or_create_folder(session: requests.Session, folder_name: str, access_token: str,
+                         base_url: str = GRAPH_URL) -> str:
+    """Id of the folder with this name in the drive root, creating it if needed"""
+    headers = {"Authorization": f"Bearer {access_token}"}
+    folder_id = find_folder(session, folder_name, headers, base_url)
+    if folder_id:
+        return folder_id
+    try:
+        resp = request_with_retry(
+            session, "POST", f"{base_url}/me/drive/root/children", headers=headers,
+            json={"name": folder_name, "folder": {}, "@microsoft.graph.conflictBehavior": "fail"}
+        )
+        return resp.json()["id"]
+    except requests.HTTPError as e:
+        # The folder exists: an earlier attempt whose response was lost, or another uploader
+        if e.response is None or e.response.status_code != 409:
+            raise
+    folder_id = find_folder(session, folder_name, headers, base_url)
+    if not folder_id:
+        raise ValueError(f"Folder {folder_name} was reported as existing but could not be found")
+    return folder_id
+
+
+def next_expected_offset(upload_status: Dict) -> int:
+    # nextExpectedRanges looks like ["26214400-"] or ["0-1023", "2048-"]
+    return int(upload_status["nextExpectedRanges"][0].split("-")[0])
+
+
+def upload_in_chunks(session: requests.Session, upload_url: str, data: BinaryIO, total: int) -> Dict:
+    """Send data through an upload session, resuming from the server's offset after failures"""
+    offset = 0
+    failures = 0
+    while True:
+        data.seek(offset)
+        chunk = data.read(UPLOAD_CHUNK_SIZE)
+        response = None
+        try:
+            # The upload URL is pre-authenticated and must not get an Authorization header
+            response = session.put(
+                upload_url, data=chunk, timeout=REQUEST_TIMEOUT,
+                headers={"Content-Range": f"bytes {offset}-{offset + len(chunk) - 1}/{total}"}
+            )
+            if response.status_code in (200, 201):
+                return response.json()
+            if response.status_code == 202:
+                offset = next_expected_offset(response.json())
+                failures = 0
+                continue
+            if response.status_code not in RETRY_STATUSES:
+                response.raise_for_status()
+        except (requests.ConnectionError, requests.Timeout):
+            if failures == MAX_RETRIES:
+                raise
+        if failures == MAX_RETRIES:
+            response.raise_for_status()
+        time.sleep(retry_delay(failures, response))
+        failures += 1
+        # Ask the session which bytes it already has before sending more
+        status = request_with_retry(session, "GET", upload_url)
+        offset = next_expected_offset(status.json())
+
+
+def upload_file(session: requests.Session, folder_id: str, filename: str,
+                data: Union[bytes, BinaryIO], access_token: str, base_url: str = GRAPH_URL) -> str:
+    """Upload bytes or a seekable binary file into a folder and return its drive item id"""
+    headers = {"Authorization": f"Bearer {access_token}"}
+    item_url = f"{base_url}/me/drive/items/{folder_id}:/{requests.utils.quote(filename)}:"
+    if isinstance(data, (bytes, bytearray)):
+        data = io.BytesIO(data)
+    total = data.seek(0, io.SEEK_END)
+    if total <= SIMPLE_UPLOAD_LIMIT:
+        data.seek(0)
+        resp = request_with_retry(session, "PUT", f"{item_url}/content", headers=headers, data=data.read())
+        return resp.json()["id"]
+
+    resp = request_with_retry(
+        session, "POST", f"{item_url}/createUploadSession", headers=headers,
+        json={"item": {"@microsoft.graph.conflictBehavior": "replace"}}
+    )
+    return upload_in_chunks(session, resp.json()["uploadUrl"], data, total)["id"]
+
+
+def upload_files(folder_id: str, files: Dict[str, Callable[[], Union[bytes, BinaryIO]]], access_token: str,
+                 on_progress: Optional[Callable[[str, Optional[Exception], int, int], None]] = None,
+                 max_workers: int = MAX_WORKERS,
+                 base_url: str = GRAPH_URL) -> Tuple[Dict[str, str], Dict[str, Exception]]:
+    """Upload files into a folder using a bounded worker pool.
+
+    Each value in `files` produces the bytes or seekable file to upload and
+    runs on a worker, so encryption happens in parallel with other uploads.
+    Produced files are closed once uploaded. `on_progress` is
+    called from the calling thread as (filename, error, completed, total).
+    Returns the drive item id of each uploaded file, and the files that
+    failed after all retries mapped to their error.
+    """
+    uploaded = {}
+    failed = {}
+    with create_session(max_workers) as session:
+
+        def produce_and_upload(filename: str, produce: Callable[[], Union[bytes, BinaryIO]]) -> str:
+            data = produce()
+            try:
+                return upload_file(session, folder_id, filename, data, access_token, base_url)
+            finally:
+                if hasattr(data, "close"):
+                    data.close()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(produce_and_upload, filename, produce): filename
+                for filename, produce in files.items()
+            }
+            for completed, future in enumerate(as_completed(futures), start=1):
+                filename = futures[future]
+                error = future.exception()
+                if error is None:
+                    uploaded[filename] = future.result()
+                else:
+                    failed[filename] = error
+                if on_progress:
+                    on_progress(filename, error, completed, len(futures))
+    return uploaded, failed
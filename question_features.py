@@ -0,0 +1,61 @@
+import hashlib
+import html
+import json
+import re
+from typing import Dict
+
+# Only the answer instruction: "(Choose two.)", "(Select 3)" anywhere, or a closing "Choose two."
+_REQUIRED_ANSWERS = re.compile(
+    r"\((?:choose|select)\s+(two|three|four|five|[2-9])\b[^)]*\)"
+    r"|\b(?:choose|select)\s+(two|three|four|five|[2-9])\s*[.:!]?\s*$",
+    re.IGNORECASE
+)
+_NUMBER_WORDS = {"two": 2, "three": 3, "four": 4, "five": 5}
+_TAGS = re.compile(r"<[^>]+>")
+_WHITESPACE = re.compile(r"\s+")
+# Set by users in Edit mode rather than by the imported dump
+USER_STATE_FIELDS = ("verifiedAnswer", "isMarked")
+# Stored alongside the content but computed from it
+DERIVED_FIELDS = ("_id", "plainText", "requiredAnswers", "isMultiSelect", "optionCount", "contentHash")
+
+
+def readable_text(text: str) -> str:
+    """Question text without HTML, entities or repeated whitespace"""
+    text = html.unescape(_TAGS.sub(" ", text or ""))
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def plain_text(text: str) -> str:
+    """readable_text lowercased, as stored for matching and search"""
+    return readable_text(text).lower()
+
+
+def required_answer_count(text: str) -> int:
+    # The last instruction wins, earlier ones may be part of the scenario
+    matches = list(_REQUIRED_ANSWERS.finditer(text))
+    if not matches:
+        return 1
+    word = (matches[-1].group(1) or matches[-1].group(2)).lower()
+    return _NUMBER_WORDS.get(word) or int(word)
+
+
+def extract_features(question: Dict) -> Dict:
+    """Fields derived from a question's content, stored with it at save time"""
+    text = plain_text(question.get("questionText", ""))
+    required_answers = required_answer_count(text)
+    return {
+        "plainText": text,
+        "requiredAnswers": required_answers,
+        "isMultiSelect": required_answers > 1,
+        "optionCount": len(question.get("options", []))
+    }
+
+
+def content_hash(question: Dict) -> str:
+    """Stable hash of a question's imported content, ignoring user state and derived fields"""
+    content = {
+        field: value for field, value in question.items()
+        if field not in USER_STATE_FIELDS and field not in DERIVED_FIELDS
+    }
+    encoded = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
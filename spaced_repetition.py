@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+# SM-2 starting and minimum easiness factors
+DEFAULT_EASINESS = 2.5
+MIN_EASINESS = 1.3
+# Answers are only right or wrong, mapped onto SM-2's 0-5 recall quality
+CORRECT_QUALITY = 4
+INCORRECT_QUALITY = 1
+
+
+def next_review(state: Optional[Dict], correct: bool, reviewed_at: datetime) -> Dict:
+    """SM-2 scheduling state after one answer, given the state before it (None if never seen)"""
+    state = state or {}
+    easiness = state.get("easiness", DEFAULT_EASINESS)
+    repetitions = state.get("repetitions", 0)
+    interval = state.get("interval", 0)
+    quality = CORRECT_QUALITY if correct else INCORRECT_QUALITY
+
+    if quality < 3:
+        # A lapse restarts the sequence of growing intervals
+        repetitions = 0
+        interval = 1
+    else:
+        repetitions += 1
+        if repetitions == 1:
+            interval = 1
+        elif repetitions == 2:
+            interval = 6
+        else:
+            interval = round(interval * easiness)
+    easiness = max(MIN_EASINESS, easiness + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+    return {
+        "easiness": easiness,
+        "repetitions": repetitions,
+        "interval": interval,
+        "due": reviewed_at + timedelta(days=interval),
+        "lastReviewed": reviewed_at
+    }
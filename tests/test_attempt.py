@@ -0,0 +1,38 @@
+from datetime import datetime
+import pytest
+import database
+from attempt import PracticeAttempt
+
+# Needs mongomock, which currently requires pymongo<4.9
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = mongomock.MongoClient().quizdb
+    monkeypatch.setattr(database, "get_database", lambda: db)
+    return db
+
+
+def test_checkpoint_round_trip(db):
+    attempt = PracticeAttempt("E", "P", [5, 2, 9], 60, 2, "21-40", datetime(2024, 1, 1, 9, 30))
+    attempt.answers[0] = "A"
+    attempt.answers[2] = "BD"
+    attempt.marks[1] = 1
+
+    database.save_attempt_checkpoint("u@example.com", "E", "P", attempt.to_checkpoint(current_question=2))
+    checkpoint = database.get_attempt_checkpoint("u@example.com", "E", "P")
+    assert checkpoint["currentQuestion"] == 2
+    assert checkpoint["marks"] == [False, True, False]
+
+    restored = PracticeAttempt.from_checkpoint(checkpoint)
+    assert (restored.exam, restored.provider) == ("E", "P")
+    assert list(restored.question_numbers) == [5, 2, 9]
+    assert restored.answers == ["A", "", "BD"]
+    assert isinstance(restored.marks, bytearray)
+    assert list(restored.marks) == [0, 1, 0]
+    assert (restored.session_minutes, restored.batch_number, restored.batch_range) == (60, 2, "21-40")
+    assert restored.started_at == datetime(2024, 1, 1, 9, 30)
+    # Restored marks stay mutable like a fresh attempt's
+    restored.marks[0] = 1
+    assert restored.to_checkpoint(0)["marks"] == [True, True, False]
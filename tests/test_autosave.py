@@ -0,0 +1,101 @@
+import threading
+import pytest
+import autosave
+from autosave import CheckpointBuffer
+
+KEY = ("u@example.com", "E", "P")
+OTHER = ("v@example.com", "E", "P")
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(autosave, "save_attempt_checkpoint", lambda *args: record_save(calls, *args))
+    monkeypatch.setattr(autosave, "delete_attempt_checkpoint", lambda *key: calls.append(("delete", key)))
+    return calls
+
+
+def record_save(calls, email, exam_name, provider, checkpoint):
+    calls.append(("save", (email, exam_name, provider), checkpoint))
+
+
+@pytest.fixture
+def buffer():
+    # Long enough that the background thread never flushes during a test
+    return CheckpointBuffer(interval=3600)
+
+
+def test_updates_are_coalesced(calls, buffer):
+    for current in range(5):
+        buffer.update(KEY, {"currentQuestion": current})
+    buffer.update(OTHER, {"currentQuestion": 9})
+    buffer.flush()
+    assert calls == [("save", KEY, {"currentQuestion": 4}), ("save", OTHER, {"currentQuestion": 9})]
+    buffer.flush()
+    assert len(calls) == 2
+
+
+def test_flush_one_key(calls, buffer):
+    buffer.update(KEY, {"currentQuestion": 1})
+    buffer.update(OTHER, {"currentQuestion": 2})
+    buffer.flush(KEY)
+    buffer.flush(KEY)
+    assert calls == [("save", KEY, {"currentQuestion": 1})]
+    buffer.flush()
+    assert calls[1:] == [("save", OTHER, {"currentQuestion": 2})]
+
+
+def test_failed_write_is_retried(calls, buffer, monkeypatch):
+    def failing_save(*args):
+        raise ConnectionError("database unavailable")
+    monkeypatch.setattr(autosave, "save_attempt_checkpoint", failing_save)
+    buffer.update(KEY, {"currentQuestion": 1})
+    buffer.flush()
+
+    monkeypatch.setattr(autosave, "save_attempt_checkpoint", lambda *args: record_save(calls, *args))
+    buffer.flush()
+    assert calls == [("save", KEY, {"currentQuestion": 1})]
+
+
+def test_failed_write_does_not_replace_a_newer_checkpoint(calls, buffer, monkeypatch):
+    def failing_save(*args):
+        buffer.update(KEY, {"currentQuestion": 2})
+        raise ConnectionError("database unavailable")
+    monkeypatch.setattr(autosave, "save_attempt_checkpoint", failing_save)
+    buffer.update(KEY, {"currentQuestion": 1})
+    buffer.flush()
+
+    monkeypatch.setattr(autosave, "save_attempt_checkpoint", lambda *args: record_save(calls, *args))
+    buffer.flush()
+    assert calls == [("save", KEY, {"currentQuestion": 2})]
+
+
+def test_discard_drops_the_pending_checkpoint(calls, buffer):
+    buffer.update(KEY, {"currentQuestion": 1})
+    buffer.discard(KEY)
+    buffer.flush()
+    assert calls == [("delete", KEY)]
+
+
+def test_discard_waits_for_an_in_flight_write(calls, buffer, monkeypatch):
+    writing, release = threading.Event(), threading.Event()
+
+    def slow_save(*args):
+        writing.set()
+        release.wait(5)
+        record_save(calls, *args)
+    monkeypatch.setattr(autosave, "save_attempt_checkpoint", slow_save)
+    buffer.update(KEY, {"currentQuestion": 1})
+    flusher = threading.Thread(target=buffer.flush)
+    flusher.start()
+    assert writing.wait(5)
+
+    discarder = threading.Thread(target=buffer.discard, args=(KEY,))
+    discarder.start()
+    discarder.join(0.2)
+    # The delete must not overtake the write, or the checkpoint would come back
+    assert discarder.is_alive() and calls == []
+    release.set()
+    flusher.join(5)
+    discarder.join(5)
+    assert calls == [("save", KEY, {"currentQuestion": 1}), ("delete", KEY)]
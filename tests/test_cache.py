@@ -0,0 +1,76 @@
+import time
+from cache import keyed_cache
+
+
+def counting_cache(**options):
+    calls = []
+
+    @keyed_cache(**options)
+    def load(key):
+        calls.append(key)
+        return {"key": key, "items": [key]}
+    return load, calls
+
+
+def test_values_are_copied_per_caller():
+    load, calls = counting_cache()
+    first = load(1)
+    first["items"].append(2)
+    assert load(1) == {"key": 1, "items": [1]}
+    assert calls == [1]
+
+
+def test_invalidate_prefix_drops_matching_keys():
+    calls = []
+
+    @keyed_cache()
+    def load(*key):
+        calls.append(key)
+        return key
+    load("a", 1), load("a", 2), load("b", 1)
+    load.invalidate_prefix("a")
+    load("a", 1), load("b", 1)
+    assert calls == [("a", 1), ("a", 2), ("b", 1), ("a", 1)]
+
+
+def test_expired_entries_are_evicted_on_store(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+    load, calls = counting_cache(ttl=10)
+    for key in range(5):
+        load(key)
+    clock[0] += 11
+    load("fresh")
+    # Every older entry expired and was dropped when "fresh" was stored
+    load(0)
+    assert calls == [0, 1, 2, 3, 4, "fresh", 0]
+    load("fresh")
+    assert calls.count("fresh") == 1
+
+
+def test_max_entries_evicts_oldest():
+    load, calls = counting_cache(max_entries=3)
+    for key in range(4):
+        load(key)
+    load(3), load(2), load(1)
+    assert calls == [0, 1, 2, 3]
+    load(0)
+    assert calls == [0, 1, 2, 3, 0]
+
+
+def test_patch_of_shared_value_replaces_it():
+    load, calls = counting_cache(copy_values=False)
+    before = load(1)
+    load.patch(1, update=lambda value: value.update(key=2))
+    assert before["key"] == 1
+    assert load(1)["key"] == 2
+    assert calls == [1]
+
+
+def test_patch_copy_values_leaves_earlier_reads_untouched():
+    load, calls = counting_cache()
+    before = load(1)
+    load.patch(1, update=lambda value: value.update(verifiedAnswer="A"))
+    assert "verifiedAnswer" not in before
+    assert load(1)["verifiedAnswer"] == "A"
+    assert calls == [1]
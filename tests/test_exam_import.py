@@ -0,0 +1,155 @@
+import io
+import json
+import pytest
+from exam_import import (
+    answer_key_entry, iter_exam_questions, iter_json_array, parse_answer_key, parse_marked, scan_exam_file
+)
+
+
+def parse(data: bytes, chunk_size: int = 4):
+    return list(iter_json_array(io.BytesIO(data), chunk_size=chunk_size))
+
+
+def question(number: int, exam: str = "E", **fields) -> dict:
+    return {"exam": exam, "provider": "P", "questionNumber": number, "questionText": "Which?",
+            "options": [{"optionLetter": "A", "optionText": "é"}], **fields}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64 * 1024])
+def test_elements_survive_any_chunk_boundary(chunk_size):
+    values = [12345, -1.5e10, "ünïcödé ✓", {"a": [1, 2, {"b": None}]}, [], True, "x" * 50]
+    data = json.dumps(values, ensure_ascii=False).encode("utf-8")
+    assert parse(data, chunk_size) == values
+
+
+@pytest.mark.parametrize("data, expected", [
+    (b"[]", []),
+    (b"  [ ]  \n", []),
+    (b"\xef\xbb\xbf[1, 2]", [1, 2]),
+    (b"[1]\n\t ", [1]),
+])
+def test_whitespace_bom_and_empty(data, expected):
+    assert parse(data) == expected
+
+
+@pytest.mark.parametrize("data", [
+    b"[1]x",
+    b"[]garbage",
+    b"[1] [2]",
+    b'[{"a": 1}],',
+])
+def test_rejects_data_after_the_array(data):
+    with pytest.raises(ValueError, match="after the question array"):
+        parse(data)
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b'{"questions": []}',
+    b"[1, 2",
+    b'[{"a": 1',
+    b"[1 2]",
+    b"[1,]",
+])
+def test_rejects_malformed_arrays(data):
+    with pytest.raises(ValueError):
+        parse(data)
+
+
+def test_exam_questions_are_validated_while_streaming():
+    data = json.dumps([question(1), question(2)]).encode("utf-8")
+    assert [q["questionNumber"] for q in iter_exam_questions(io.BytesIO(data))] == [1, 2]
+
+
+@pytest.mark.parametrize("questions, message", [
+    ([question(1), question(1)], "Duplicate questionNumber"),
+    ([question(1), question(2, exam="Other")], "belongs to"),
+    ([question(0)], "Invalid questionNumber"),
+    ([question(1, options=[])], "options"),
+    ([question(1, comments=[{"commentHead": "h"}])], "commentContent"),
+    (["not an object"], "JSON object"),
+])
+def test_invalid_questions(questions, message):
+    data = json.dumps(questions).encode("utf-8")
+    with pytest.raises(ValueError, match=message):
+        list(iter_exam_questions(io.BytesIO(data)))
+
+
+def test_scan_exam_file():
+    data = json.dumps([question(n) for n in range(1, 4)]).encode("utf-8")
+    assert scan_exam_file(io.BytesIO(data)) == {"exam": "E", "provider": "P", "count": 3}
+    with pytest.raises(ValueError, match="no questions"):
+        scan_exam_file(io.BytesIO(b"[]"))
+
+
+def answer_key(data: bytes, filename: str = "key.csv") -> dict:
+    return parse_answer_key(io.BytesIO(data), filename)
+
+
+@pytest.mark.parametrize("value, expected", [
+    (True, True), (False, False), ("yes", True), (" X ", True), ("1", True), (1, True),
+    ("No", False), ("n", False), ("0", False), (0, False),
+])
+def test_parse_marked(value, expected):
+    assert parse_marked(value, 1) is expected
+
+
+@pytest.mark.parametrize("value", ["maybe", "2", "", None])
+def test_parse_marked_rejects_other_values(value):
+    with pytest.raises(ValueError, match="Question 4: isMarked"):
+        parse_marked(value, 4)
+
+
+def test_answer_key_entry():
+    assert answer_key_entry({"questionNumber": " 3 ", "verifiedAnswer": " bd ", "isMarked": "yes"}) == {
+        "questionNumber": 3, "fields": {"verifiedAnswer": "BD", "isMarked": True}
+    }
+    # Blank cells leave the stored value unchanged
+    assert answer_key_entry({"questionNumber": 3, "verifiedAnswer": "", "isMarked": ""}) == {
+        "questionNumber": 3, "fields": {}
+    }
+    assert answer_key_entry({"questionNumber": 3, "isMarked": False})["fields"] == {"isMarked": False}
+    with pytest.raises(ValueError, match="Invalid questionNumber"):
+        answer_key_entry({"questionNumber": "three", "verifiedAnswer": "A"})
+
+
+def test_csv_answer_key():
+    data = "\ufeffquestionNumber,verifiedAnswer,isMarked\n1, b ,\n2,C,yes\n3,,no\n4,,\n".encode("utf-8")
+    assert answer_key(data) == {1: {"verifiedAnswer": "B"}, 2: {"verifiedAnswer": "C", "isMarked": True},
+                                3: {"isMarked": False}}
+
+
+def test_csv_answer_key_with_one_column():
+    assert answer_key(b"questionNumber,isMarked\r\n5,true\r\n") == {5: {"isMarked": True}}
+
+
+def test_json_answer_key_mapping():
+    data = b'{"5": "d", "6": {"isMarked": true}, "7": {"verifiedAnswer": "a", "isMarked": "no"}}'
+    assert answer_key(data, "key.JSON") == {
+        5: {"verifiedAnswer": "D"}, 6: {"isMarked": True}, 7: {"verifiedAnswer": "A", "isMarked": False}
+    }
+
+
+def test_json_answer_key_list():
+    data = b'\xef\xbb\xbf[{"questionNumber": 7, "verifiedAnswer": "A", "isMarked": false}, {"questionNumber": 8}]'
+    assert answer_key(data, "key.json") == {7: {"verifiedAnswer": "A", "isMarked": False}}
+
+
+@pytest.mark.parametrize("data, filename, message", [
+    (b"questionNumber,verifiedAnswer\n1,A\n1,B\n", "key.csv", "Duplicate questionNumber: 1"),
+    (b'[{"questionNumber": 2, "verifiedAnswer": "A"}, {"questionNumber": "2", "isMarked": true}]',
+     "key.json", "Duplicate questionNumber: 2"),
+    (b"questionNumber,isMarked\n1,maybe\n", "key.csv", "isMarked must be true or false"),
+    (b"questionNumber,verifiedAnswer\nx,A\n", "key.csv", "Invalid questionNumber"),
+    (b"questionNumber,verifiedAnswer\n1,\n", "key.csv", "empty"),
+    (b"questionNumber,verifiedAnswer\n", "key.csv", "empty"),
+    (b'"A"', "key.json", "Expected a JSON object"),
+    (b'[1, 2]', "key.json", "Expected a JSON object"),
+])
+def test_invalid_answer_keys(data, filename, message):
+    with pytest.raises(ValueError, match=message):
+        answer_key(data, filename)
+
+
+def test_blank_duplicate_rows_are_ignored():
+    assert answer_key(b"questionNumber,verifiedAnswer\n1,A\n1,\n") == {1: {"verifiedAnswer": "A"}}
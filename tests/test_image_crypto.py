@@ -0,0 +1,133 @@
+import io
+import secrets
+import struct
+import pytest
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+import image_crypto
+from image_crypto import decrypt_image, decrypt_stream, encrypt_image, encrypt_stream
+
+KEY = bytes(range(32))
+CHUNK = 16
+HEADER_SIZE = struct.calcsize(">4sBI7s")
+FRAME_SIZE = struct.calcsize(">BI")
+
+
+def encrypt(data: bytes, chunk_size: int = CHUNK) -> bytes:
+    dst = io.BytesIO()
+    encrypt_stream(io.BytesIO(data), dst, KEY, chunk_size)
+    return dst.getvalue()
+
+
+def decrypt(data: bytes) -> bytes:
+    return decrypt_image(data, KEY)
+
+
+def frames(blob: bytes) -> list:
+    """Split a chunked blob into its header and raw frames"""
+    header, pos, result = blob[:HEADER_SIZE], HEADER_SIZE, []
+    while pos < len(blob):
+        _, length = struct.unpack(">BI", blob[pos:pos + FRAME_SIZE])
+        result.append(blob[pos:pos + FRAME_SIZE + length])
+        pos += FRAME_SIZE + length
+    return [header] + result
+
+
+@pytest.mark.parametrize("size", [0, 1, CHUNK - 1, CHUNK, CHUNK + 1, 2 * CHUNK, 3 * CHUNK + 5])
+def test_round_trip(size):
+    data = secrets.token_bytes(size)
+    blob = encrypt(data)
+    assert decrypt(blob) == data
+    # Empty input is one empty final frame; exact multiples do not add an empty frame
+    assert len(frames(blob)) - 1 == max(1, -(-size // CHUNK))
+
+
+def test_round_trip_default_chunk_size():
+    data = secrets.token_bytes(image_crypto.CHUNK_SIZE * 2 + 3)
+    assert decrypt_image(encrypt_image(data, KEY), KEY) == data
+
+
+def test_same_plaintext_encrypts_differently():
+    assert encrypt(b"image") != encrypt(b"image")
+
+
+def test_wrong_key_is_rejected():
+    with pytest.raises(InvalidTag):
+        decrypt_image(encrypt(b"image data"), bytes(32))
+
+
+@pytest.mark.parametrize("cut", [1, FRAME_SIZE, image_crypto.TAG_SIZE])
+def test_truncated_stream_is_rejected(cut):
+    blob = encrypt(secrets.token_bytes(3 * CHUNK))
+    with pytest.raises(ValueError, match="truncated"):
+        decrypt(blob[:-cut])
+
+
+def test_dropped_final_frame_is_rejected():
+    parts = frames(encrypt(secrets.token_bytes(3 * CHUNK)))
+    with pytest.raises(ValueError, match="truncated"):
+        decrypt(b"".join(parts[:-1]))
+
+
+def test_reordered_frames_are_rejected():
+    header, first, second, *rest = frames(encrypt(secrets.token_bytes(3 * CHUNK)))
+    with pytest.raises(InvalidTag):
+        decrypt(b"".join([header, second, first, *rest]))
+
+
+def test_frames_cannot_move_between_files():
+    one = frames(encrypt(secrets.token_bytes(2 * CHUNK)))
+    other = frames(encrypt(secrets.token_bytes(2 * CHUNK)))
+    with pytest.raises(InvalidTag):
+        decrypt(b"".join([one[0], other[1], one[2]]))
+
+
+@pytest.mark.parametrize("position", [4, HEADER_SIZE - 1, HEADER_SIZE + FRAME_SIZE + 3, -1])
+def test_tampering_is_rejected(position):
+    blob = bytearray(encrypt(secrets.token_bytes(2 * CHUNK)))
+    blob[position] ^= 0x01
+    with pytest.raises((InvalidTag, ValueError)):
+        decrypt(bytes(blob))
+
+
+def test_final_flag_cannot_be_cleared_or_set():
+    header, first, second = frames(encrypt(secrets.token_bytes(2 * CHUNK)))
+    with pytest.raises(InvalidTag):
+        decrypt(header + bytes([1]) + first[1:])
+    with pytest.raises(InvalidTag):
+        decrypt(header + first + bytes([0]) + second[1:] + second)
+
+
+def test_data_after_final_frame_is_rejected():
+    with pytest.raises(ValueError, match="after the final frame"):
+        decrypt(encrypt(b"image") + b"x")
+
+
+def test_oversized_frame_is_rejected():
+    header, frame = frames(encrypt(b"image"))
+    with pytest.raises(ValueError, match="corrupt"):
+        decrypt(header + struct.pack(">BI", 1, CHUNK + image_crypto.TAG_SIZE + 1) + frame[FRAME_SIZE:])
+
+
+@pytest.mark.parametrize("size", [0, 5, 100])
+def test_legacy_blob_is_decrypted(size):
+    data = secrets.token_bytes(size)
+    nonce = secrets.token_bytes(image_crypto.LEGACY_NONCE_SIZE)
+    legacy = nonce + AESGCM(KEY).encrypt(nonce, data, None)
+    assert decrypt(legacy) == data
+
+
+def test_legacy_blob_truncated_or_tampered():
+    nonce = secrets.token_bytes(image_crypto.LEGACY_NONCE_SIZE)
+    legacy = nonce + AESGCM(KEY).encrypt(nonce, b"legacy image", None)
+    with pytest.raises(ValueError, match="truncated"):
+        decrypt(legacy[:image_crypto.LEGACY_NONCE_SIZE + 3])
+    with pytest.raises(InvalidTag):
+        decrypt(legacy[:-1] + bytes([legacy[-1] ^ 1]))
+
+
+def test_decrypt_stream_writes_to_file():
+    data = secrets.token_bytes(5 * CHUNK)
+    dst = io.BytesIO()
+    decrypt_stream(io.BytesIO(encrypt(data)), dst, KEY)
+    assert dst.getvalue() == data
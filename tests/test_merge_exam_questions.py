@@ -0,0 +1,85 @@
+import pytest
+import database
+from question_features import content_hash
+
+# Needs mongomock, which currently requires pymongo<4.9
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = mongomock.MongoClient().quizdb
+    monkeypatch.setattr(database, "get_database", lambda: db)
+    return db
+
+
+def question(number: int, text: str = "Which?", **fields) -> dict:
+    return {"exam": "E", "provider": "P", "questionNumber": number, "questionText": text,
+            "options": [{"optionLetter": "A", "optionText": "a"}], **fields}
+
+
+def stored(db, number: int) -> dict:
+    return db.questions.find_one({"exam": "E", "provider": "P", "questionNumber": number}, {"_id": 0})
+
+
+def merge(questions) -> dict:
+    return database.merge_exam_questions("E", "P", questions)
+
+
+def test_new_questions_take_user_state_from_the_dump(db):
+    summary = merge([question(1, verifiedAnswer="A", isMarked=True), question(2, "Choose two.")])
+    assert summary == {"added": 2, "changed": 0, "unchanged": 0}
+    first, second = stored(db, 1), stored(db, 2)
+    assert first["verifiedAnswer"] == "A" and first["isMarked"]
+    assert second["verifiedAnswer"] == "" and not second["isMarked"]
+    assert second["requiredAnswers"] == 2 and second["plainText"] == "choose two."
+    assert first["contentHash"] == content_hash(question(1))
+
+
+def test_reimport_keeps_user_state(db):
+    merge([question(1), question(2), question(3)])
+    db.questions.update_many({"questionNumber": {"$in": [1, 2]}},
+                             {"$set": {"verifiedAnswer": "B", "isMarked": True}})
+    # The dump's own user state is ignored for questions already stored
+    summary = merge([question(1, verifiedAnswer="", isMarked=False),
+                     question(2, "Which region?", verifiedAnswer="C", isMarked=False),
+                     question(3)])
+    assert summary == {"added": 0, "changed": 1, "unchanged": 2}
+    for number in (1, 2):
+        assert stored(db, number)["verifiedAnswer"] == "B"
+        assert stored(db, number)["isMarked"]
+    assert stored(db, 3)["verifiedAnswer"] == ""
+
+
+def test_changed_questions_are_replaced(db):
+    merge([question(1, suggestedAnswer="A", comments=[{"commentContent": "old"}])])
+    db.questions.update_one({"questionNumber": 1}, {"$set": {"verifiedAnswer": "A"}})
+    summary = merge([question(1, "<b>Which</b> two? (Choose two.)", suggestedAnswer="AB")])
+    assert summary == {"added": 0, "changed": 1, "unchanged": 0}
+    doc = stored(db, 1)
+    # Fields the refreshed dump no longer has are dropped, derived fields are recomputed
+    assert "comments" not in doc
+    assert doc["suggestedAnswer"] == "AB"
+    assert doc["verifiedAnswer"] == "A"
+    assert doc["plainText"] == "which two? (choose two.)"
+    assert doc["isMultiSelect"]
+    assert doc["contentHash"] == content_hash(question(1, "<b>Which</b> two? (Choose two.)", suggestedAnswer="AB"))
+
+
+def test_unchanged_questions_are_not_written(db):
+    merge([question(1), question(2)])
+    # A replaced document would lose this field
+    db.questions.update_many({}, {"$set": {"untouched": True}})
+    assert merge([question(1), question(2)]) == {"added": 0, "changed": 0, "unchanged": 2}
+    assert db.questions.count_documents({"untouched": True}) == 2
+    assert merge([question(1), question(2, "Which one?"), question(3)]) == {
+        "added": 1, "changed": 1, "unchanged": 1
+    }
+    assert [doc["questionNumber"] for doc in db.questions.find({"untouched": True})] == [1]
+
+
+def test_merge_only_touches_its_exam(db):
+    merge([question(1)])
+    database.merge_exam_questions("Other", "P", [{**question(1, "Other?"), "exam": "Other"}])
+    assert stored(db, 1)["questionText"] == "Which?"
+    assert db.questions.count_documents({}) == 2
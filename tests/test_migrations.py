@@ -0,0 +1,68 @@
+from datetime import datetime
+import pytest
+import migrations
+
+# Needs mongomock, which currently requires pymongo<4.9
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().quizdb
+
+
+@pytest.fixture
+def applied(monkeypatch):
+    applied = []
+
+    def migration(name):
+        return name, lambda db: applied.append(name)
+    monkeypatch.setattr(migrations, "MIGRATIONS", [migration("0001_a"), migration("0002_b"), migration("0003_c")])
+    return applied
+
+
+def states(db) -> dict:
+    return {m["_id"]: m.get("state") for m in db.migrations.find()}
+
+
+def test_migrations_run_once(db, applied):
+    migrations.run_migrations(db)
+    migrations.run_migrations(db)
+    assert applied == ["0001_a", "0002_b", "0003_c"]
+    assert states(db) == {"0001_a": "done", "0002_b": "done", "0003_c": "done"}
+
+
+def test_records_without_state_count_as_applied(db, applied):
+    db.migrations.insert_one({"_id": "0001_a", "applied_at": datetime(2024, 1, 1)})
+    migrations.run_migrations(db)
+    assert applied == ["0002_b", "0003_c"]
+
+
+def test_migration_claimed_by_another_process_stops_the_run(db, applied):
+    db.migrations.insert_one({"_id": "0001_a", "state": "done"})
+    db.migrations.insert_one({"_id": "0002_b", "state": "running"})
+    migrations.run_migrations(db)
+    assert applied == []
+    assert "0003_c" not in states(db)
+
+
+def test_claim_lost_to_a_concurrent_process(db, applied, monkeypatch):
+    claim = migrations.claim_migration
+
+    def racing_claim(db, name):
+        # Another process claims the migration between our read and our claim
+        if name == "0002_b":
+            db.migrations.insert_one({"_id": name, "state": "running"})
+        return claim(db, name)
+    monkeypatch.setattr(migrations, "claim_migration", racing_claim)
+    migrations.run_migrations(db)
+    assert applied == ["0001_a"]
+
+
+def test_failed_migration_releases_its_claim(db, applied, monkeypatch):
+    def broken(db):
+        raise RuntimeError("migration failed")
+    monkeypatch.setattr(migrations, "MIGRATIONS", [("0001_a", broken)])
+    with pytest.raises(RuntimeError):
+        migrations.run_migrations(db)
+    assert states(db) == {}
@@ -0,0 +1,236 @@
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+import pytest
+import requests
+import onedrive
+
+# Status used in a fault to drop the connection without any response
+DROP = 0
+
+
+class FakeGraph:
+    """Just enough of the Graph drive API for folder lookup, creation and uploads.
+
+    A fault (method, path fragment, status, applied) makes the next matching
+    request fail with status; when applied is set the request takes effect
+    first, as if only its response was lost.
+    """
+
+    def __init__(self):
+        self.folders = {}
+        self.files = {}
+        self.sessions = {}
+        self.requests = []
+        self.faults = []
+        self.lock = threading.Lock()
+
+    def take_fault(self, method, path):
+        with self.lock:
+            self.requests.append((method, path))
+            for fault in self.faults:
+                if fault[0] == method and fault[1] in path:
+                    self.faults.remove(fault)
+                    return fault
+        return None
+
+    def count(self, method, fragment):
+        return sum(1 for m, path in self.requests if m == method and fragment in path)
+
+
+def make_handler(graph: FakeGraph, base_url: list):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, status, body=None):
+            payload = json.dumps(body or {}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def handle_request(self, method):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            path = unquote(self.path)
+            fault = graph.take_fault(method, path)
+            if fault and not fault[3]:
+                return self.fail(fault[2])
+            status, response = self.apply(method, path, body)
+            if fault:
+                return self.fail(fault[2])
+            self.reply(status, response)
+
+        def fail(self, status):
+            if status == DROP:
+                self.close_connection = True
+                return
+            self.reply(status)
+
+        def apply(self, method, path, body):
+            if method == "GET" and path.startswith("/me/drive/root:/"):
+                name = path[len("/me/drive/root:/"):]
+                if name in graph.folders:
+                    return 200, {"id": graph.folders[name]}
+                return 404, {}
+            if method == "POST" and path == "/me/drive/root/children":
+                name = json.loads(body)["name"]
+                if name in graph.folders:
+                    return 409, {}
+                graph.folders[name] = f"folder-{name}"
+                return 201, {"id": graph.folders[name]}
+            if path.startswith("/me/drive/items/"):
+                name = path.split(":/")[1].split(":")[0]
+                if path.endswith("/content"):
+                    graph.files[name] = body
+                    return 201, {"id": f"item-{name}"}
+                graph.sessions[name] = bytearray()
+                return 200, {"uploadUrl": f"{base_url[0]}/upload/{name}"}
+            name = path[len("/upload/"):]
+            received = graph.sessions[name]
+            if method == "GET":
+                return 200, {"nextExpectedRanges": [f"{len(received)}-"]}
+            byte_range, total = self.headers["Content-Range"].split()[1].split("/")
+            if int(byte_range.split("-")[0]) != len(received):
+                return 416, {}
+            received.extend(body)
+            if len(received) == int(total):
+                graph.files[name] = bytes(received)
+                return 201, {"id": f"item-{name}"}
+            return 202, {"nextExpectedRanges": [f"{len(received)}-"]}
+
+        def do_GET(self):
+            self.handle_request("GET")
+
+        def do_POST(self):
+            self.handle_request("POST")
+
+        def do_PUT(self):
+            self.handle_request("PUT")
+
+    return Handler
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    monkeypatch.setattr(onedrive, "RETRY_BACKOFF_SECONDS", 0)
+    monkeypatch.setattr(onedrive, "SIMPLE_UPLOAD_LIMIT", 1000)
+    monkeypatch.setattr(onedrive, "UPLOAD_CHUNK_SIZE", 320)
+    fake = FakeGraph()
+    base_url = [None]
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(fake, base_url))
+    base_url[0] = fake.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield fake
+    server.shutdown()
+    server.server_close()
+
+
+def test_retry_delay_prefers_retry_after():
+    response = requests.Response()
+    response.headers["Retry-After"] = "7"
+    assert onedrive.retry_delay(3, response) == 7
+    assert onedrive.retry_delay(3, None) == onedrive.RETRY_BACKOFF_SECONDS * 8
+
+
+@pytest.mark.parametrize("status", [429, 503, DROP])
+def test_request_with_retry_recovers(graph, status):
+    graph.folders["exam"] = "folder-exam"
+    graph.faults += [("GET", "/exam", status, False)] * 2
+    with onedrive.create_session(1) as session:
+        response = onedrive.request_with_retry(session, "GET", f"{graph.base_url}/me/drive/root:/exam")
+    assert response.json() == {"id": "folder-exam"}
+    assert graph.count("GET", "/exam") == 3
+
+
+def test_request_with_retry_gives_up(graph, monkeypatch):
+    monkeypatch.setattr(onedrive, "MAX_RETRIES", 2)
+    graph.faults += [("GET", "/exam", 503, False)] * 3
+    with onedrive.create_session(1) as session, pytest.raises(requests.HTTPError):
+        onedrive.request_with_retry(session, "GET", f"{graph.base_url}/me/drive/root:/exam")
+    assert graph.count("GET", "/exam") == 3
+
+
+def test_request_with_retry_does_not_retry_client_errors(graph):
+    with onedrive.create_session(1) as session, pytest.raises(requests.HTTPError) as error:
+        onedrive.request_with_retry(session, "GET", f"{graph.base_url}/me/drive/root:/missing")
+    assert error.value.response.status_code == 404
+    assert graph.count("GET", "/missing") == 1
+
+
+def test_get_or_create_folder(graph):
+    with onedrive.create_session(1) as session:
+        created = onedrive.get_or_create_folder(session, "new exam", "token", graph.base_url)
+        found = onedrive.get_or_create_folder(session, "new exam", "token", graph.base_url)
+    assert created == found == "folder-new exam"
+    assert graph.count("POST", "/children") == 1
+
+
+@pytest.mark.parametrize("status", [503, DROP])
+def test_get_or_create_folder_after_lost_create_response(graph, status):
+    # The folder is created but the response never arrives, so the retried POST gets a 409
+    graph.faults.append(("POST", "/children", status, True))
+    with onedrive.create_session(1) as session:
+        folder_id = onedrive.get_or_create_folder(session, "exam", "token", graph.base_url)
+    assert folder_id == "folder-exam"
+    assert graph.count("POST", "/children") == 2
+
+
+def upload_session(graph, name):
+    graph.sessions[name] = bytearray()
+    return f"{graph.base_url}/upload/{name}"
+
+
+def test_upload_in_chunks(graph):
+    data = bytes(range(256)) * 5
+    with onedrive.create_session(1) as session:
+        item = onedrive.upload_in_chunks(session, upload_session(graph, "a.bin"), io.BytesIO(data), len(data))
+    assert item == {"id": "item-a.bin"}
+    assert graph.files["a.bin"] == data
+    assert graph.count("PUT", "/upload/") == 4
+
+
+@pytest.mark.parametrize("status, applied", [(500, True), (DROP, True), (503, False), (DROP, False)])
+def test_upload_in_chunks_resumes_from_server_offset(graph, status, applied):
+    data = bytes(range(256)) * 5
+    graph.faults += [("PUT", "/upload/", status, applied), ("PUT", "/upload/", status, applied)]
+    with onedrive.create_session(1) as session:
+        onedrive.upload_in_chunks(session, upload_session(graph, "a.bin"), io.BytesIO(data), len(data))
+    assert graph.files["a.bin"] == data
+    # Every failure is followed by a status request that tells the client where to resume
+    assert graph.count("GET", "/upload/") == 2
+
+
+def test_upload_in_chunks_gives_up(graph, monkeypatch):
+    monkeypatch.setattr(onedrive, "MAX_RETRIES", 1)
+    data = b"x" * 1000
+    graph.faults += [("PUT", "/upload/", 503, False)] * 2
+    with onedrive.create_session(1) as session, pytest.raises(requests.HTTPError):
+        onedrive.upload_in_chunks(session, upload_session(graph, "a.bin"), io.BytesIO(data), len(data))
+
+
+def test_upload_files(graph):
+    files = {f"image{i}.png": bytes([i]) * (i * 150) for i in range(1, 12)}
+    producers = {name: (lambda data=data: data) for name, data in files.items()}
+
+    def broken():
+        raise ValueError("cannot read image")
+    producers["broken.png"] = broken
+    graph.faults.append(("PUT", "/image3.png", 503, False))
+    progress = []
+
+    uploaded, failed = onedrive.upload_files(
+        "folder", producers, "token", on_progress=lambda *args: progress.append(args),
+        max_workers=3, base_url=graph.base_url
+    )
+    assert uploaded == {name: f"item-{name}" for name in files}
+    assert graph.files == files
+    assert list(failed) == ["broken.png"] and isinstance(failed["broken.png"], ValueError)
+    assert sorted(completed for _, _, completed, _ in progress) == list(range(1, 13))
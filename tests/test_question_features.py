@@ -0,0 +1,56 @@
+import pytest
+from question_features import DERIVED_FIELDS, USER_STATE_FIELDS, content_hash, extract_features, required_answer_count
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Which region should you use?", 1),
+    ("Which two actions should you perform? (Choose two.)", 2),
+    ("Which settings apply? (Select 3)", 3),
+    ("Which actions should you perform? Choose three.", 3),
+    ("Each correct answer presents part of the solution. SELECT TWO", 2),
+    ("You select two VMs. What happens?", 1),
+    ("You choose three regions for the deployment. Which one is cheapest?", 1),
+    ("You select three VMs and restart them. (Choose two.)", 2),
+    ("(Choose three.) You then choose two of them later. (Choose two.)", 2),
+])
+def test_required_answer_count(text, expected):
+    assert required_answer_count(text.lower()) == expected
+
+
+def test_extract_features_single_answer_scenario():
+    features = extract_features({
+        "questionText": "<p>You select two VMs.</p><p>What happens?</p>",
+        "options": [{"optionLetter": "A"}, {"optionLetter": "B"}]
+    })
+    assert features["requiredAnswers"] == 1
+    assert not features["isMultiSelect"]
+    assert features["optionCount"] == 2
+
+
+def test_extract_features_multi_select():
+    features = extract_features({"questionText": "<p>Which two?</p><p>(Choose two.)</p>", "options": []})
+    assert features["requiredAnswers"] == 2
+    assert features["isMultiSelect"]
+
+
+QUESTION = {"questionNumber": 1, "questionText": "Which?", "options": [{"optionLetter": "A", "optionText": "a"}],
+            "suggestedAnswer": "A"}
+
+
+@pytest.mark.parametrize("field", USER_STATE_FIELDS + DERIVED_FIELDS)
+def test_content_hash_ignores_user_state_and_derived_fields(field):
+    assert content_hash({**QUESTION, field: "anything"}) == content_hash(QUESTION)
+
+
+def test_content_hash_ignores_key_order():
+    assert content_hash(dict(reversed(list(QUESTION.items())))) == content_hash(QUESTION)
+
+
+@pytest.mark.parametrize("change", [
+    {"questionText": "Which one?"},
+    {"options": [{"optionLetter": "A", "optionText": "b"}]},
+    {"suggestedAnswer": "B"},
+    {"comments": []},
+])
+def test_content_hash_changes_with_content(change):
+    assert content_hash({**QUESTION, **change}) != content_hash(QUESTION)
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+import pytest
+from spaced_repetition import DEFAULT_EASINESS, MIN_EASINESS, next_review
+
+NOW = datetime(2024, 1, 1, 9, 30)
+
+
+def review(answers, easiness=DEFAULT_EASINESS):
+    """Scheduling state after answering a new question with each of answers in turn"""
+    state = {"easiness": easiness}
+    for correct in answers:
+        state = next_review(state, correct, NOW)
+    return state
+
+
+def test_first_review_of_a_new_question():
+    state = next_review(None, True, NOW)
+    assert state["repetitions"] == 1
+    assert state["interval"] == 1
+    assert state["due"] == NOW + timedelta(days=1)
+    assert state["lastReviewed"] == NOW
+
+
+def test_intervals_grow_by_easiness():
+    # Correct answers keep easiness at 2.5 - 0.1 + 0.1 = 2.5
+    intervals = []
+    state = None
+    for _ in range(5):
+        state = next_review(state, True, NOW)
+        intervals.append(state["interval"])
+    assert intervals == [1, 6, 15, 38, 95]
+    assert state["easiness"] == pytest.approx(DEFAULT_EASINESS)
+    assert state["due"] == NOW + timedelta(days=95)
+
+
+def test_interval_is_rounded():
+    state = next_review({"easiness": 1.9, "repetitions": 2, "interval": 6}, True, NOW)
+    assert state["interval"] == round(6 * 1.9)
+
+
+def test_lapse_resets_repetitions_and_interval():
+    state = review([True, True, True, False])
+    assert state["repetitions"] == 0
+    assert state["interval"] == 1
+    assert state["due"] == NOW + timedelta(days=1)
+    # The sequence then starts again from the first interval
+    assert next_review(state, True, NOW)["interval"] == 1
+    assert review([True, True, True, False, True, True])["interval"] == 6
+
+
+def test_lapse_lowers_easiness():
+    state = next_review(None, False, NOW)
+    assert state["easiness"] == pytest.approx(DEFAULT_EASINESS - 0.54)
+
+
+def test_easiness_floor():
+    state = review([False] * 5)
+    assert state["easiness"] == MIN_EASINESS
+    assert next_review({"easiness": 1.4}, False, NOW)["easiness"] == MIN_EASINESS
+    assert review([True, True, True], easiness=MIN_EASINESS)["easiness"] == pytest.approx(MIN_EASINESS)
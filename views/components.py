@@ -1,5 +1,6 @@
 import streamlit as st
 from typing import Dict, List
+from database import get_question_details
 
 def format_comment_head(head: str) -> str:
     """Format special phrases in comment headers as bold"""
@@ -32,18 +33,27 @@ def format_vote_distribution(votes: List[Dict]) -> str:
 
 def show_question_comments(question: Dict):
     """Shared function to display question comments consistently"""
+    # Comments and votes are not part of the light exam payload, fetch them on demand
+    details = get_question_details(question["exam"], question["provider"], question["questionNumber"])
+    
     st.write("Comments:")
-    for comment in question["comments"]:
+    for comment in details.get("comments", []):
         head = comment['commentHead'].replace('\n', ' ').replace('\t', ' ').strip()
         head = format_comment_head(head)
         content = comment['commentContent'].replace('\n', ' ').replace('\t', ' ').strip()
         selected = f" [{comment.get('commentSelectedAnswer', '')}]" if comment.get('commentSelectedAnswer') else ""
         st.markdown(f"{head}{selected}: {content}")
     
-    st.markdown(f"Suggested Answer: {question['suggestedAnswer']}", unsafe_allow_html=True)
+    st.markdown(f"Suggested Answer: {details.get('suggestedAnswer', '')}", unsafe_allow_html=True)
     
     # Format and display vote distribution
-    vote_dist = format_vote_distribution(question["voteDistribution"])
+    vote_dist = format_vote_distribution(details.get("voteDistribution", []))
     st.markdown(f"Vote Distribution: {vote_dist}")
     
-    st.write(f"Verified Answer: {question['verifiedAnswer']}")
+    st.write(f"Verified Answer: {question.get('verifiedAnswer', '')}")
+
+def show_question_details_toggle(question: Dict):
+    """Show question details only once requested, so nothing is fetched while collapsed"""
+    if st.toggle("Show Details", key=f"details_{question['questionNumber']}"):
+        with st.container(border=True):
+            show_question_comments(question)
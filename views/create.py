@@ -1,65 +1,26 @@
 import streamlit as st
-import json
-from database import save_exam
-import os
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-import secrets
-import requests
-import msal
-
-def encrypt_image(image_bytes, key):
-    nonce = secrets.token_bytes(12)
-    aesgcm = AESGCM(key)
-    encrypted = aesgcm.encrypt(nonce, image_bytes, None)
-    return nonce + encrypted  # prepend nonce for later decryption
-
-def get_msal_access_token():
-    """Get OneDrive access token using MSAL with cached credentials"""
-    CLIENT_ID = st.secrets.get("MICROSOFT_CLIENT_ID")
-    TENANT_ID = st.secrets.get("MICROSOFT_TENANT_ID", "common")
-    SCOPES = ["Files.ReadWrite"]
-    
-    if not CLIENT_ID:
-        raise ValueError("MICROSOFT_CLIENT_ID not configured in secrets")
-    
-    authority = f"https://login.microsoftonline.com/{TENANT_ID}"
-    app = msal.PublicClientApplication(CLIENT_ID, authority=authority)
-    
-    # Try to use cached token first
-    accounts = app.get_accounts()
-    if accounts:
-        result = app.acquire_token_silent(SCOPES, account=accounts[0])
-        if "access_token" in result:
-            return result["access_token"]
-    
-    # If no cached token, user needs to authenticate
-    raise Exception(
-        "No cached authentication available. Please ensure you've logged in with Microsoft "
-        "and the MSAL cache is accessible. If this is your first time, logout and login again."
-    )
-
-def upload_to_onedrive(folder_name, files, access_token):
-    # Create folder in OneDrive
-    folder_url = f"https://graph.microsoft.com/v1.0/me/drive/root/children"
-    headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
-    folder_data = {"name": folder_name, "folder": {}, "@microsoft.graph.conflictBehavior": "rename"}
-    resp = requests.post(folder_url, headers=headers, json=folder_data)
-    resp.raise_for_status()
-    folder_id = resp.json()["id"]
-
-    # Upload each file
-    for filename, file_bytes in files.items():
-        upload_url = f"https://graph.microsoft.com/v1.0/me/drive/items/{folder_id}:/"+filename+":/content"
-        upload_resp = requests.put(upload_url, headers={"Authorization": f"Bearer {access_token}"}, data=file_bytes)
-        upload_resp.raise_for_status()
+from database import get_exam_list
+from exam_import import scan_exam_file, import_exam
+from image_sync import sync_image_folder
+from auth import get_msal_access_token, start_onedrive_login, complete_onedrive_login
 
 def create_exam():
     st.header("Create New Exam")
     uploaded_file = st.file_uploader("Upload JSON file", type="json")
     if uploaded_file:
-        exam_data = json.load(uploaded_file)
-        uploaded_questions = len(exam_data)
-        st.info(f"Uploaded file contains {uploaded_questions} questions")
+        # Validate once per upload; reruns reuse the scan result
+        scan = st.session_state.get("exam_file_scan")
+        if not scan or scan["file_id"] != uploaded_file.file_id:
+            try:
+                uploaded_file.seek(0)
+                scan = {"file_id": uploaded_file.file_id, **scan_exam_file(uploaded_file)}
+            except ValueError as e:
+                st.error(f"Invalid exam file: {e}")
+                return
+            st.session_state.exam_file_scan = scan
+        uploaded_questions = scan["count"]
+        st.info(f"Uploaded file contains {uploaded_questions} questions "
+                f"for {scan['exam']} - {scan['provider']}")
         
         session_time = st.number_input("Session Time (minutes)", min_value=1, value=60)
         total_questions = st.number_input("Total Questions", min_value=1, value=uploaded_questions)
@@ -75,14 +36,20 @@ def create_exam():
         )
         if image_files:
             folder_name = st.text_input("Enter folder name for OneDrive (must match local folder name)")
+            if st.button("Sign in to OneDrive"):
+                try:
+                    flow = start_onedrive_login()
+                    st.info(flow["message"])
+                    with st.spinner("Waiting for sign-in to complete..."):
+                        complete_onedrive_login(flow)
+                    st.success("Signed in to OneDrive")
+                except ValueError as e:
+                    st.error(f"Configuration error: {e}")
+                except Exception as e:
+                    st.error(str(e))
             if st.button("Encrypt and Upload Images to OneDrive"):
                 # Load AES key from secrets
                 key = bytes.fromhex(st.secrets["AES_KEY"])
-                encrypted_files = {}
-                for img in image_files:
-                    img_bytes = img.read()
-                    encrypted = encrypt_image(img_bytes, key)
-                    encrypted_files[img.name] = encrypted
                 
                 if not folder_name:
                     st.error("Please enter a folder name.")
@@ -90,13 +57,50 @@ def create_exam():
                     try:
                         # Get access token using MSAL
                         access_token = get_msal_access_token()
-                        upload_to_onedrive(folder_name, encrypted_files, access_token)
-                        st.success("All images encrypted and uploaded to OneDrive successfully!")
+                        progress_bar = st.progress(0.0, text="Uploading images...")
+                        
+                        def show_progress(filename, error, completed, total):
+                            status = "failed" if error else "uploaded"
+                            progress_bar.progress(completed / total,
+                                                  text=f"{completed}/{total}: {filename} {status}")
+                        
+                        # Only new or changed images are encrypted and uploaded
+                        result = sync_image_folder(folder_name, {img.name: img for img in image_files},
+                                                   key, access_token, on_progress=show_progress)
+                        progress_bar.progress(1.0, text="Done")
+                        st.info(f"Uploaded {len(result['uploaded'])} images, "
+                                f"{len(result['skipped'])} unchanged images skipped")
+                        if result["failed"]:
+                            st.error(f"{len(result['failed'])} images failed to upload:")
+                            for filename, error in result["failed"].items():
+                                st.write(f"{filename}: {error}")
+                        else:
+                            st.success("All images encrypted and uploaded to OneDrive successfully!")
                     except ValueError as e:
                         st.error(f"Configuration error: {e}")
                     except Exception as e:
                         st.error(f"Upload failed: {e}")
 
+        exam_exists = any(e["exam"] == scan["exam"] and e["provider"] == scan["provider"]
+                          for e in get_exam_list())
+        incremental = False
+        if exam_exists:
+            st.warning(f"{scan['exam']} - {scan['provider']} already exists")
+            incremental = st.checkbox("Keep verified answers and marks (only write new or changed questions)",
+                                      value=True)
+
         if st.button("Save Exam"):
-            save_exam(exam_data, session_time, total_questions, uploaded_questions, questions_per_session)
-            st.success("Exam saved successfully!")
+            progress_bar = st.progress(0.0, text="Saving questions...")
+            uploaded_file.seek(0)
+            summary = import_exam(
+                uploaded_file, session_time, total_questions, questions_per_session,
+                progress=lambda saved: progress_bar.progress(
+                    saved / uploaded_questions, text=f"Saved {saved}/{uploaded_questions} questions"
+                ),
+                incremental=incremental
+            )
+            if incremental:
+                st.success(f"Exam updated: {summary['added']} added, {summary['changed']} changed, "
+                           f"{summary['unchanged']} unchanged, {summary['removed']} removed")
+            else:
+                st.success("Exam saved successfully!")
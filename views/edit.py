@@ -1,7 +1,117 @@
+import math
 import streamlit as st
-from database import (get_exam_list, get_exam, update_exam_metadata, 
-                     update_single_question, save_note, get_note)
-from .components import show_question_comments
+from typing import Dict, List, Set
+from database import (get_exam_list, get_exam_light, update_exam_metadata, 
+                     update_single_question, save_note, clear_exam_cache,
+                     get_exam_notes, bulk_update_questions,
+                     ConcurrentModificationError)
+from exam_import import parse_answer_key
+from .components import show_question_details_toggle
+
+# Number of question buttons rendered in the sidebar at a time
+NAV_PAGE_SIZE = 25
+NAV_FILTERS = ["All", "Marked", "Unverified", "Has note"]
+
+def go_to_question(index: int):
+    st.session_state.editing_question = index
+
+def go_to_nav_page(page: int):
+    st.session_state.nav_page = page
+
+def filter_question_indices(questions: List[Dict], nav_filter: str, noted: Set[int]) -> List[int]:
+    if nav_filter == "Marked":
+        return [i for i, q in enumerate(questions) if q.get("isMarked", False)]
+    if nav_filter == "Unverified":
+        return [i for i, q in enumerate(questions) if not q.get("verifiedAnswer")]
+    if nav_filter == "Has note":
+        return [i for i, q in enumerate(questions) if q["questionNumber"] in noted]
+    return list(range(len(questions)))
+
+def jump_to_question_number(questions: List[Dict]):
+    """Callback for the jump-to input: select the question and show its page"""
+    select_question_number(questions, st.session_state.nav_jump)
+
+def select_question_number(questions: List[Dict], number: int):
+    for i, q in enumerate(questions):
+        if q["questionNumber"] == number:
+            st.session_state.editing_question = i
+            st.session_state.nav_filter = "All"
+            st.session_state.nav_page = i // NAV_PAGE_SIZE
+            return
+
+def import_answer_key(exam_name: str, provider: str):
+    """Form callback: apply an uploaded answer key before the page is rendered"""
+    uploaded_file = st.session_state.answer_key_file
+    if uploaded_file is None:
+        st.session_state.answer_key_result = ("warning", "Choose a CSV or JSON answer key first")
+        return
+    try:
+        updates = parse_answer_key(uploaded_file, uploaded_file.name)
+    except (ValueError, UnicodeDecodeError) as e:
+        st.session_state.answer_key_result = ("error", f"Invalid answer key: {str(e)}")
+        return
+
+    result = bulk_update_questions(exam_name, provider, updates)
+    if result is None:
+        st.session_state.answer_key_result = ("error", "Failed to import the answer key")
+        return
+    # Let the edit widgets pick up the imported values
+    for question_number in updates:
+        st.session_state.pop(f"verified_{question_number}", None)
+        st.session_state.pop(f"edit_mark_{question_number}", None)
+    message = f"Updated {result['modified']} of {len(updates)} questions"
+    unknown = len(updates) - result["matched"]
+    if unknown:
+        message += f", {unknown} question numbers are not in this exam"
+    st.session_state.answer_key_result = ("success", message)
+
+def show_answer_key_import(exam_name: str, provider: str):
+    with st.expander("Import Answer Key", expanded=False):
+        st.caption("CSV with questionNumber, verifiedAnswer and/or isMarked columns, "
+                   "or JSON mapping question numbers to answers")
+        with st.form("answer_key_form", clear_on_submit=True):
+            st.file_uploader("Answer key", type=["csv", "json"], key="answer_key_file")
+            st.form_submit_button("Import", on_click=import_answer_key, args=(exam_name, provider))
+        if "answer_key_result" in st.session_state:
+            level, message = st.session_state.pop("answer_key_result")
+            getattr(st, level)(message)
+
+def show_question_navigator(questions: List[Dict], noted: Set[int]):
+    """Sidebar navigator that renders only one page of the filtered questions"""
+    nav_filter = st.sidebar.selectbox("Show", NAV_FILTERS, key="nav_filter",
+                                      on_change=go_to_nav_page, args=(0,))
+    st.sidebar.number_input("Jump to question", min_value=1, step=1, value=None,
+                            key="nav_jump", on_change=jump_to_question_number, args=(questions,))
+    
+    indices = filter_question_indices(questions, nav_filter, noted)
+    if not indices:
+        st.sidebar.caption("No matching questions")
+        return
+    
+    num_pages = math.ceil(len(indices) / NAV_PAGE_SIZE)
+    page = min(st.session_state.get("nav_page", 0), num_pages - 1)
+    st.sidebar.caption(f"{len(indices)} questions, page {page + 1}/{num_pages}")
+    
+    for i in indices[page * NAV_PAGE_SIZE:(page + 1) * NAV_PAGE_SIZE]:
+        q = questions[i]
+        icons = []
+        if q.get("isMarked", False):
+            icons.append("🚩")
+        if not q.get("verifiedAnswer"):
+            icons.append("⚠️")
+            
+        icon_str = " ".join(icons)
+        button_label = f"{q['questionNumber']} {icon_str}"
+        if i == st.session_state.editing_question:
+            button_label = f"**{button_label}**"
+        
+        st.sidebar.button(button_label, key=f"nav_{i}", on_click=go_to_question, args=(i,))
+    
+    cols = st.sidebar.columns(2)
+    cols[0].button("◀", key="nav_prev_page", disabled=page == 0,
+                   on_click=go_to_nav_page, args=(page - 1,))
+    cols[1].button("▶", key="nav_next_page", disabled=page >= num_pages - 1,
+                   on_click=go_to_nav_page, args=(page + 1,))
 
 def edit_exam():
     question_nav = st.sidebar.container()
@@ -15,16 +125,17 @@ def edit_exam():
     selected_exam = st.selectbox(
         "Select Exam to Edit",
         options=[None] + [(e["exam"], e["provider"]) for e in exams],
-        format_func=lambda x: "Select an exam..." if x is None else f"{x[0]} - {x[1]}"
+        format_func=lambda x: "Select an exam..." if x is None else f"{x[0]} - {x[1]}",
+        key="edit_exam"
     )
 
     if selected_exam:
-        exam = get_exam(selected_exam[0], selected_exam[1])
+        exam = get_exam_light(selected_exam[0], selected_exam[1])
         
-        # Add verification progress stats
-        total_questions = len(exam["questions"])
-        verified_questions = sum(1 for q in exam["questions"] if q.get("verifiedAnswer"))
-        marked_questions = [q["questionNumber"] for q in exam["questions"] if q.get("isMarked", False)]
+        # Verification progress stats are kept current in the exam metadata
+        total_questions = exam["metadata"]["uploadedQuestions"]
+        verified_questions = exam["metadata"]["verifiedCount"]
+        marked_questions = exam["metadata"]["markedQuestions"]
         progress_percentage = (verified_questions / total_questions) * 100
 
         # Display metrics in three columns
@@ -44,7 +155,7 @@ def edit_exam():
         st.progress(progress_percentage / 100)
         st.divider()
         
-        st.button("🔄 Refresh Cache", on_click=get_exam.clear)
+        st.button("🔄 Refresh Cache", on_click=clear_exam_cache)
         
         with st.expander("Edit Exam Settings", expanded=False):
             st.subheader("Metadata")
@@ -73,44 +184,37 @@ def edit_exam():
             )
             
             if metadata_modified and st.button("Save Settings"):
-                if update_exam_metadata(selected_exam[0], selected_exam[1],
-                                      new_session_time, new_total_questions,
-                                      new_questions_per_session):
-                    st.success("Settings updated successfully!")
-                    st.rerun()
-                else:
-                    st.error("Failed to update settings")
+                try:
+                    if update_exam_metadata(selected_exam[0], selected_exam[1],
+                                          new_session_time, new_total_questions,
+                                          new_questions_per_session,
+                                          expected_version=meta.get("version", 0)):
+                        st.success("Settings updated successfully!")
+                        st.rerun()
+                    else:
+                        st.error("Failed to update settings")
+                except ConcurrentModificationError:
+                    st.warning("These settings were changed by someone else since the page loaded. "
+                               "Review the current values and save again.")
+
+        show_answer_key_import(selected_exam[0], selected_exam[1])
 
         st.subheader("")
-        questions = sorted(exam["questions"], key=lambda q: q['questionNumber'])
+        # Questions come back in metadata.questionOrder, sorted by questionNumber
+        questions = exam["questions"]
 
+        # Opened from a Search result
+        if "edit_target_question" in st.session_state:
+            select_question_number(questions, st.session_state.pop("edit_target_question"))
+
+        # Every note for this exam in one query; paging through questions reads from this map
+        notes = get_exam_notes(st.session_state.user_email, selected_exam[0], selected_exam[1])
         with question_nav:
-            st.sidebar.markdown("""
-                <style>
-                    .question-nav { max-height: 400px; overflow-y: auto; padding: 10px; }
-                    .nav-button { width: 100%; text-align: left; background: none; margin: 2px 0; }
-                    .current { background-color: #e6f3ff !important; }
-                </style>
-            """, unsafe_allow_html=True)
-            
-            for i, q in enumerate(questions):
-                icons = []
-                if q.get("isMarked", False):
-                    icons.append("🚩")
-                if not q.get("verifiedAnswer"):
-                    icons.append("⚠️")
-                    
-                icon_str = " ".join(icons)
-                button_key = f"nav_{i}"
-                
-                button_label = f"{q['questionNumber']} {icon_str}"
-                if i == st.session_state.editing_question:
-                    button_label = f"**{button_label}**"
-                
-                if st.sidebar.button(button_label, key=button_key, use_container_width=False):
-                    st.session_state.editing_question = i
-                    st.rerun()
+            noted = {question_number for question_number, text in notes.items() if text}
+            show_question_navigator(questions, noted)
 
+        # Keep the selection valid when switching to an exam with fewer questions
+        st.session_state.editing_question = min(st.session_state.editing_question, len(questions) - 1)
         question = questions[st.session_state.editing_question]
         st.markdown(f'<div id="{st.session_state.editing_question}"></div>', unsafe_allow_html=True)
         with st.container():
@@ -138,16 +242,9 @@ def edit_exam():
                 )
             
             with cols[0]:
-                current_note = get_note(
-                    st.session_state.user_email,
-                    selected_exam[0],
-                    selected_exam[1],
-                    question["questionNumber"]
-                )
-                
                 note_text = st.text_area(
                     "Notes",
-                    value=current_note,
+                    value=notes.get(question["questionNumber"], ""),
                     key=f"note_{question['questionNumber']}"
                 )
                 
@@ -178,17 +275,14 @@ def edit_exam():
                         else:
                             st.error("Failed to save note")
             
-            with st.expander("Show Details"):
-                show_question_comments(question)
+            show_question_details_toggle(question)
 
         cols = st.columns(2)
         with cols[0]:
             if st.session_state.editing_question > 0:
-                if st.button("← Previous"):
-                    st.session_state.editing_question -= 1
-                    st.rerun()
+                st.button("← Previous", on_click=go_to_question,
+                          args=(st.session_state.editing_question - 1,))
         with cols[1]:
             if st.session_state.editing_question < len(questions) - 1:
-                if st.button("Next →"):
-                    st.session_state.editing_question += 1
-                    st.rerun()
+                st.button("Next →", on_click=go_to_question,
+                          args=(st.session_state.editing_question + 1,))
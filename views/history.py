@@ -1,12 +1,13 @@
 import streamlit as st
-from database import get_exam_list, get_user_exam_attempts
+from database import get_exam_list, get_user_exam_attempts, get_all_user_attempts, get_attempt_answers
 from typing import Dict
 
 def show_attempt_details(attempt: Dict):
     with st.expander("View Attempt Details"):
         st.write("Analysis")
         
-        answers = sorted(attempt["answers"], key=lambda x: x["questionNumber"])
+        # Answers are only loaded when an attempt is opened
+        answers = sorted(get_attempt_answers(attempt["_id"]), key=lambda x: x["questionNumber"])
         
         for q in answers:
             user_answer = q.get("userAnswer", "No answer")
@@ -38,19 +39,12 @@ def show_history():
     )
     
     if selected_exam[0] is None:
-        all_attempts = []
-        for exam in exams:
-            attempts = get_user_exam_attempts(st.session_state.user_email, 
-                                           exam["exam"], exam["provider"])
-            for attempt in attempts:
-                attempt["exam_name"] = exam["exam"]
-                attempt["provider"] = exam["provider"]
-                all_attempts.append(attempt)
+        all_attempts = get_all_user_attempts(st.session_state.user_email)
     else:
         all_attempts = get_user_exam_attempts(st.session_state.user_email, 
                                             selected_exam[0], selected_exam[1])
         for attempt in all_attempts:
-            attempt["exam_name"] = selected_exam[0]
+            attempt["exam"] = selected_exam[0]
             attempt["provider"] = selected_exam[1]
     
     if all_attempts:
@@ -63,13 +57,14 @@ def show_history():
         cols[4].write("**Duration**")
         cols[5].write("**Details**")
         
-        for attempt in sorted(all_attempts, key=lambda x: x["completed_at"], reverse=True):
+        # Attempts come back newest first from the database
+        for attempt in all_attempts:
             cols[0].write(attempt["completed_at"].strftime("%Y-%m-%d %H:%M"))
-            cols[1].write(f"{attempt['exam_name']} ({attempt['provider']})")
+            cols[1].write(f"{attempt['exam']} ({attempt['provider']})")
             cols[2].write(f"Batch {attempt.get('batch_number', '?')} ({attempt.get('batch_range', 'unknown')})")
             cols[3].write(f"{attempt['score']:.2f}%")
             cols[4].write(f"{attempt['duration_minutes']:.1f}")
-            if cols[5].button("Details", key=f"detail_{attempt['completed_at'].strftime('%Y%m%d%H%M%S')}"):
+            if cols[5].button("Details", key=f"detail_{attempt['_id']}"):
                 show_attempt_details(attempt)
     else:
         st.info("No attempts found")
@@ -1,14 +1,23 @@
 import streamlit as st
 import math
 from datetime import datetime, timedelta
-from database import get_exam_list, get_exam, save_user_progress, get_user_exam_attempts
-from .components import show_question_comments
+from database import (get_exam_list, get_exam_metadata, get_batch_question_numbers,
+                      save_user_progress, get_user_exam_attempts, get_attempt_checkpoint,
+                      get_review_session)
+from attempt import PracticeAttempt
+from autosave import get_checkpoint_buffer
+from .components import show_question_details_toggle
+
+# Number of previous attempts listed above the practice options
+RECENT_ATTEMPTS_LIMIT = 10
 
 def show_attempt_history(exam_name: str, provider: str):
-    attempts = get_user_exam_attempts(st.session_state.user_email, exam_name, provider)
+    attempts = get_user_exam_attempts(st.session_state.user_email, exam_name, provider,
+                                      RECENT_ATTEMPTS_LIMIT)
     
     if attempts:
         st.subheader("Previous Attempts")
+        st.caption(f"Showing the {len(attempts)} most recent attempts, see History for details")
         history_df = {
             "Date": [],
             "Batch": [],
@@ -26,33 +35,66 @@ def show_attempt_history(exam_name: str, provider: str):
     else:
         st.info("No previous attempts for this exam")
 
+def checkpoint_key(exam_name: str, provider: str) -> tuple:
+    return (st.session_state.user_email, exam_name, provider)
+
+def checkpoint_attempt(flush: bool = False):
+    """Queue the attempt for autosave, writing it straight away when flush is set"""
+    attempt = st.session_state.attempt
+    key = checkpoint_key(attempt.exam, attempt.provider)
+    buffer = get_checkpoint_buffer()
+    buffer.update(key, attempt.to_checkpoint(st.session_state.current_question))
+    if flush:
+        buffer.flush(key)
+
+def go_to_question(index: int):
+    st.session_state.current_question = index
+    checkpoint_attempt(flush=True)
+
+def submit_attempt(attempt: PracticeAttempt):
+    show_results(attempt)
+    get_checkpoint_buffer().discard(checkpoint_key(attempt.exam, attempt.provider))
+    st.session_state.attempt = None
+
 def show_quiz():
-    question = st.session_state.exam_data[st.session_state.current_question]
+    attempt = st.session_state.attempt
+    available = attempt.available_indexes()
+    if not available:
+        st.error("All questions of this attempt were removed from the exam")
+        if st.button("Submit"):
+            submit_attempt(attempt)
+        return
+    index = st.session_state.current_question
+    if index not in available:
+        # Skip questions a re-import removed since the attempt started
+        index = next((i for i in available if i > index), available[-1])
+        st.session_state.current_question = index
+    question = attempt.question(index)
     
     # Show timer
-    elapsed_time = datetime.now() - st.session_state.start_time
-    remaining_time = timedelta(minutes=st.session_state.exam_metadata["sessionTime"]) - elapsed_time
+    elapsed_time = datetime.now() - attempt.started_at
+    remaining_time = timedelta(minutes=attempt.session_minutes) - elapsed_time
     st.sidebar.metric("Time Remaining", str(remaining_time).split(".")[0])
     
     if remaining_time.total_seconds() <= 0:
         st.error("Time's up!")
+        # Answers given before the time ran out, e.g. in a resumed attempt, can still be scored
+        if st.button("Submit"):
+            submit_attempt(attempt)
         return
 
     st.subheader(f"{question['questionNumber']}")
     st.markdown(question["questionText"], unsafe_allow_html=True)
     
-    # Detect if multiple choice based on question text
-    is_multiple = any(phrase.lower() in question["questionText"].lower() 
-                     for phrase in ["choose two", "choose three"])
-    
-    # Show options as either checkboxes or radio buttons
-    if is_multiple:
+    # Show options as either checkboxes or radio buttons, detected when the exam was saved
+    if question.get("isMultiSelect", False):
+        st.caption(f"Select {question['requiredAnswers']} answers")
         selected_letters = []
         for opt in question["options"]:
             if st.checkbox(f"{opt['optionLetter']}. {opt['optionText']}", 
                          key=f"q_{question['questionNumber']}_{opt['optionLetter']}"):
                 selected_letters.append(opt['optionLetter'])
-        question["userAnswer"] = "".join(sorted(selected_letters))
+        attempt.answers[index] = "".join(sorted(selected_letters))
     else:
         # Create options list with full text for display
         options_display = [f"{opt['optionLetter']}. {opt['optionText']}" for opt in question["options"]]
@@ -63,48 +105,42 @@ def show_quiz():
             key=f"q_{question['questionNumber']}"
         )
         # Get letter directly from options data
-        question["userAnswer"] = question["options"][selected_index]["optionLetter"]
+        attempt.answers[index] = question["options"][selected_index]["optionLetter"]
     
-    question["isMarked"] = st.checkbox("Mark for review", 
-                                     key=f"mark_{question['questionNumber']}")
+    attempt.marks[index] = st.checkbox("Mark for review", 
+                                       key=f"mark_{question['questionNumber']}")
+    checkpoint_attempt()
     
+    previous = [i for i in available if i < index]
+    following = [i for i in available if i > index]
     cols = st.columns(2)
     with cols[0]:
-        if st.session_state.current_question > 0:
+        if previous:
             if st.button("Previous"):
-                st.session_state.current_question -= 1
+                go_to_question(previous[-1])
                 st.rerun()
                 
     with cols[1]:
-        if st.session_state.current_question < len(st.session_state.exam_data) - 1:
+        if following:
             if st.button("Next"):
-                st.session_state.current_question += 1
+                go_to_question(following[0])
                 st.rerun()
         else:
             if st.button("Submit"):
-                show_results()
-
-    with st.expander("Show Details"):
-        show_question_comments(question)
-
-def show_results():
-    attempt_answers = []
-    for q in st.session_state.exam_data:
-        user_answer = q["userAnswer"].upper()
-        verified_answer = q["verifiedAnswer"].upper()
-        attempt_answers.append({
-            "questionNumber": q["questionNumber"],
-            "verifiedAnswer": verified_answer,
-            "userAnswer": user_answer,
-            "correct": user_answer == verified_answer
-        })
+                submit_attempt(attempt)
+                return
+
+    show_question_details_toggle(question)
+
+def show_results(attempt: PracticeAttempt):
+    attempt_answers = attempt.graded_answers()
 
     correct_answers = sum(1 for a in attempt_answers if a["correct"])
     total_questions = len(attempt_answers)
     score = (correct_answers / total_questions) * 100
     
     end_time = datetime.now()
-    duration = end_time - st.session_state.start_time
+    duration = end_time - attempt.started_at
     duration_minutes = duration.total_seconds() / 60
     
     st.success(f"Final Score: {score:.2f}%")
@@ -112,15 +148,15 @@ def show_results():
     
     save_user_progress(
         st.session_state.user_email,
-        st.session_state.exam_data[0]["exam"],
-        st.session_state.exam_data[0]["provider"],
+        attempt.exam,
+        attempt.provider,
         {
             "score": score,
             "completed_at": end_time,
             "duration_minutes": duration_minutes,
             "answers": attempt_answers,
-            "batch_number": st.session_state.batch_info["number"],
-            "batch_range": st.session_state.batch_info["range"]
+            "batch_number": attempt.batch_number,
+            "batch_range": attempt.batch_range
         }
     )
 
@@ -138,18 +174,20 @@ def practice_exam():
 
     if selected_exam:
         show_attempt_history(selected_exam[0], selected_exam[1])
-        exam = get_exam(selected_exam[0], selected_exam[1])
+        show_resume_option(selected_exam)
+        # Only the metadata is loaded here; a session fetches just its own questions
+        metadata = get_exam_metadata(selected_exam[0], selected_exam[1])
         
-        if exam["metadata"].get("hasMissingQuestions", False):
-            missing = exam["metadata"]["missingQuestions"]
+        if metadata.get("hasMissingQuestions", False):
+            missing = metadata["missingQuestions"]
             st.warning(f"⚠️ This exam has {len(missing)} missing questions: {missing}")
         
         # Add practice mode selector
-        practice_mode = st.radio("Practice Mode", ["Batch", "Marked Questions"])
+        practice_mode = st.radio("Practice Mode", ["Batch", "Marked Questions", "Spaced Repetition"])
         
         if practice_mode == "Batch":
-            total_questions = exam["metadata"]["uploadedQuestions"]
-            questions_per_session = exam["metadata"]["questionsPerSession"]
+            total_questions = metadata["uploadedQuestions"]
+            questions_per_session = metadata["questionsPerSession"]
             num_batches = math.ceil(total_questions / questions_per_session)
             
             batch_options = [f"Questions {i*questions_per_session + 1} - {min((i+1)*questions_per_session, total_questions)}" 
@@ -158,37 +196,93 @@ def practice_exam():
             
             if st.button("Start New Attempt"):
                 batch_idx = batch_options.index(selected_batch)
-                start_idx = batch_idx * questions_per_session
-                end_idx = min((batch_idx + 1) * questions_per_session, total_questions)
-                
-                questions = sorted(exam["questions"][start_idx:end_idx], 
-                                key=lambda q: q['questionNumber'])
-                st.session_state.batch_info = {
-                    "number": batch_idx + 1,
-                    "range": selected_batch
-                }
-                start_practice(questions, exam["metadata"])
+                # The server slices the batch out of the sorted question order
+                question_numbers = get_batch_question_numbers(
+                    selected_exam[0], selected_exam[1],
+                    batch_idx * questions_per_session, questions_per_session
+                )
+                start_practice(selected_exam, question_numbers, metadata, batch_idx + 1, selected_batch)
+        elif practice_mode == "Spaced Repetition":
+            session = get_review_session(st.session_state.user_email, selected_exam[0], selected_exam[1],
+                                         metadata["questionsPerSession"])
+            question_numbers = session["due"] + session["new"]
+            if not question_numbers:
+                next_due = session["nextDue"]
+                st.success("Nothing is due for review" +
+                           (f" until {next_due.strftime('%Y-%m-%d %H:%M')}" if next_due else ""))
+                return
+            
+            st.info(f"{len(session['due'])} questions due for review, {len(session['new'])} new questions")
+            if st.button("Start New Attempt"):
+                start_practice(selected_exam, question_numbers, metadata, 0, "Spaced Repetition")
         else:
-            # Handle marked questions mode
-            marked_questions = [q for q in exam["questions"] if q.get("isMarked", False)]
+            # Marked questions are kept current in the exam metadata
+            marked_questions = sorted(metadata.get("markedQuestions", []))
             if not marked_questions:
                 st.warning("No marked questions found in this exam")
                 return
                 
             st.info(f"Found {len(marked_questions)} marked questions")
             if st.button("Start New Attempt"):
-                st.session_state.batch_info = {
-                    "number": 0,
-                    "range": "Marked Questions"
-                }
-                start_practice(marked_questions, exam["metadata"])
+                start_practice(selected_exam, marked_questions, metadata, 0, "Marked Questions")
 
-    if st.session_state.exam_data:
+    if st.session_state.attempt:
         show_quiz()
 
-def start_practice(questions: list, metadata: dict):
+def show_resume_option(selected_exam: tuple):
+    """Offer to continue an attempt that was autosaved before the session ended"""
+    attempt = st.session_state.attempt
+    if attempt and (attempt.exam, attempt.provider) == selected_exam:
+        return
+    key = checkpoint_key(*selected_exam)
+    # Write anything still buffered so the stored checkpoint is current
+    get_checkpoint_buffer().flush(key)
+    checkpoint = get_attempt_checkpoint(*key)
+    if not checkpoint:
+        return
+
+    answered = sum(1 for answer in checkpoint["answers"] if answer)
+    expired = datetime.now() >= checkpoint["startedAt"] + timedelta(minutes=checkpoint["sessionMinutes"])
+    st.info(f"Unfinished attempt from {checkpoint['updated_at'].strftime('%Y-%m-%d %H:%M')}: "
+            f"{checkpoint['batchRange']}, {answered} of {len(checkpoint['answers'])} answered"
+            + (", its time is up" if expired else ""))
+    cols = st.columns(2)
+    with cols[0]:
+        if expired:
+            if st.button("Submit Attempt"):
+                submit_attempt(PracticeAttempt.from_checkpoint(checkpoint))
+                return
+        elif st.button("Resume Attempt"):
+            st.session_state.attempt = PracticeAttempt.from_checkpoint(checkpoint)
+            st.session_state.current_question = checkpoint["currentQuestion"]
+            restore_widget_state(st.session_state.attempt)
+            st.rerun()
+    with cols[1]:
+        if st.button("Discard Attempt"):
+            get_checkpoint_buffer().discard(key)
+            st.rerun()
+
+def restore_widget_state(attempt: PracticeAttempt):
+    """Pre-fill the answer and mark widgets of a resumed attempt"""
+    for question, answer, marked in zip(attempt.questions(), attempt.answers, attempt.marks):
+        if question is None:
+            continue
+        number = question["questionNumber"]
+        st.session_state[f"mark_{number}"] = bool(marked)
+        if not answer:
+            continue
+        letters = [opt["optionLetter"] for opt in question["options"]]
+        if question.get("isMultiSelect", False):
+            for letter in letters:
+                st.session_state[f"q_{number}_{letter}"] = letter in answer
+        elif answer in letters:
+            st.session_state[f"q_{number}"] = letters.index(answer)
+
+def start_practice(selected_exam: tuple, question_numbers: list, metadata: dict,
+                   batch_number: int, batch_range: str):
     """Helper function to start a new practice attempt"""
-    st.session_state.exam_data = questions
-    st.session_state.exam_metadata = metadata
-    st.session_state.start_time = datetime.now()
+    st.session_state.attempt = PracticeAttempt(
+        selected_exam[0], selected_exam[1], question_numbers,
+        metadata["sessionTime"], batch_number, batch_range
+    )
     st.session_state.current_question = 0
@@ -0,0 +1,75 @@
+import streamlit as st
+from typing import Dict, List
+from database import search_questions, search_notes
+from question_features import readable_text
+
+# Characters of context shown on each side of the first matching word
+SNIPPET_CONTEXT = 80
+
+def snippet(text: str, query: str) -> str:
+    """Excerpt of text around the first word of the query it contains"""
+    lowered = text.lower()
+    terms = [term.strip('"-').lower() for term in query.split()]
+    positions = [lowered.find(term) for term in terms if term]
+    first = min((p for p in positions if p >= 0), default=0)
+    start = max(first - SNIPPET_CONTEXT, 0)
+    end = first + SNIPPET_CONTEXT * 2
+    return ("…" if start else "") + text[start:end] + ("…" if end < len(text) else "")
+
+def open_in_edit(exam_name: str, provider: str, question_number: int):
+    """Callback for a result: switch to Edit mode on that question"""
+    st.session_state.mode = "Edit"
+    st.session_state.edit_exam = (exam_name, provider)
+    st.session_state.edit_target_question = question_number
+
+def normalized_scores(matches: List[Dict]) -> List[float]:
+    """Text scores scaled to 0-1 by the best match, as scores of different indexes are not comparable"""
+    best = max((match["score"] for match in matches), default=0)
+    return [match["score"] / best if best else 0 for match in matches]
+
+def rank_results(questions: List[Dict], notes: List[Dict]) -> List[Dict]:
+    """One result per question, scored by its question and note matches together"""
+    results = {}
+    scored = list(zip(questions, normalized_scores(questions))) + list(zip(notes, normalized_scores(notes)))
+    for match, score in scored:
+        key = (match["exam"], match["provider"], match["questionNumber"])
+        result = results.setdefault(key, {
+            "exam": key[0], "provider": key[1], "questionNumber": key[2],
+            "score": 0, "questionText": "", "note": ""
+        })
+        result["score"] += score
+        if "questionText" in match:
+            result["questionText"] = readable_text(match["questionText"])
+        if "text" in match:
+            result["note"] = match["text"]
+    return sorted(results.values(), key=lambda r: r["score"], reverse=True)
+
+def show_search():
+    st.header("Search")
+    query = st.text_input("Search questions, options, comments and your notes", key="search_query")
+    if not query.strip():
+        return
+    
+    results = rank_results(search_questions(query),
+                           search_notes(st.session_state.user_email, query))
+    if not results:
+        st.info("No matches found")
+        return
+    
+    st.caption(f"{len(results)} results")
+    for result in results:
+        cols = st.columns([5, 1])
+        with cols[0]:
+            st.markdown(f"**{result['exam']} - {result['provider']} · {result['questionNumber']}**")
+            if result["questionText"]:
+                st.write(snippet(result["questionText"], query))
+            if result["note"]:
+                st.caption(f"📝 {snippet(result['note'], query)}")
+        with cols[1]:
+            st.button(
+                "Open in Edit",
+                key=f"search_open_{result['exam']}_{result['provider']}_{result['questionNumber']}",
+                on_click=open_in_edit,
+                args=(result["exam"], result["provider"], result["questionNumber"])
+            )
+        st.divider()